@@ -5,14 +5,23 @@ where the user can:
 	2. Search or edit patient record
 	3. Know the list of patient records
 	4. Delete patient records
+
+Existing patient records can be loaded from a CSV file with --import-csv
+and saved to one with --export-csv.
 '''
 
+import argparse  # For the command line options
+import sys  # For the exit status
 import time  # For sleep function
 import os   # To clear the screen
 import re   # To check for patterns
 import pyinputplus as pyip  # To validate the input
-import pprint
-import PatientRecords   # To access contents of the file
+from functools import partial  # To pass the service type on to add_Patient
+from PatientStore import PatientStore, StoreMaintenance, migrate_patient_records, SEARCH_LIMIT  # To store the patient records
+from PatientStore import PAGE_SIZE, SORT_ORDERS, page_position  # To list the records a page at a time
+from PatientStore import import_csv, export_csv  # To load and save records in bulk
+from PatientStore import EMERGENCY, OPD, PRIORITY_NAMES  # Triage priorities
+from PatientServer import RecordClient  # To share a store through the record server
 
 
 def headTitle():    # For the title in every function
@@ -36,14 +45,14 @@ def mainMenu():  # The main menu function
             print('\n\t\t\t    Invalid Input!, Type Again.')
             time.sleep(2)     # Displaying the message for 2 seconds
             os.system('cls')  # Clearing the screen
-            mainMenu()
+            return mainMenu
         elif date == dateRegex.group():
-            optionMenu()
+            return optionMenu
     except:
         print('\n\t\t\t    Invalid Input!, Type Again.')
         time.sleep(2)     # Displaying the message for 2 seconds
         os.system('cls')  # Clearing the screen
-        mainMenu()
+        return mainMenu
 
 
 def specialistMenu():   # Menu for the list of specialists
@@ -67,31 +76,17 @@ def addContinue():  # To ask user to continue or quit
         '\n\n\t\tEnter (c) to continue or (q) to quit to main menu. ', allowRegexes=[r'[(^c$)|(^q$)]'])
     # Jumping to respective functions
     if endChoice == 'c':
-        add_Patient()
+        return addRecord
     elif endChoice == 'q':
-        optionMenu()
+        return optionMenu
     else:
         print('\n\t\t\t\tInvalid number, Type again!')
         time.sleep(2)
-        addContinue()
+        return addContinue
 
 
-def add_Patient():  # Menu for adding patient record
-    # Opening the file
-    recordFile = open('PatientRecords.py', 'r+')
+def add_Patient(priority=OPD):  # Menu for adding patient record
     specialistMenu()
-    # Reading the contents of the file for Regex
-    fileContent = str(recordFile.readlines())
-    # Searching the file for matches
-    fileRegex = re.findall(pattern='patient[1-9]0? ', string=fileContent)
-    # Assigning the patient number
-    for i in range(1, 11):
-        if 'patient'+str(i)+' ' in fileRegex:
-            continue
-        else:
-            patientNumber = i
-        break
-    print('Record Patient no: ', patientNumber)
     # Asking the user for input
     patientName = pyip.inputStr('\nName: ', blockRegexes=[r'[^a-zA-Z]'])
     patientAddress = pyip.inputStr('\nAddress: ')
@@ -99,23 +94,14 @@ def add_Patient():  # Menu for adding patient record
     patientSex = pyip.inputStr('\nSex(m/f): ', blockRegexes=[r'[^mf]'])
     patientDisease = input('\nDisease Description(in short): ')
     patientSpecialist = pyip.inputInt('\nReferred Specialist room no. ')
-    # Storing the input in a dictionary
-    recordDictionary = {'Patient no.': patientNumber,
-                        'Name': patientName,
-                        'Address': patientAddress,
-                        'Age': patientAge,
-                        'Sex': patientSex,
-                        'Disease Description': patientDisease,
-                        'Referred Specialist room no.': patientSpecialist}
-    # Writing to the file
-    for i in range(1, 11):
-        recordFile.write('patient'+str(patientNumber)+' = ' +
-                         pprint.pformat(recordDictionary)+'\n')
-        break
+    # Storing the record and putting the patient in the specialist's waiting queue together;
+    # the store assigns the next patient number
+    patientNumber = store.add(patientName, patientAddress, patientAge,
+                              patientSex, patientDisease, patientSpecialist, priority)
     print('\n\t\t\t    Added the record successfully!')
-    addContinue()
-    # Closing the record file
-    recordFile.close()
+    print('\t\t\t    Record Patient no: ', patientNumber)
+    print('\t\t\t    Patients waiting for room', patientSpecialist, ':', store.triage.size(patientSpecialist))
+    return addContinue
 
 
 def addRecord():    # Menu for options to add records
@@ -132,18 +118,18 @@ def addRecord():    # Menu for options to add records
         headTitle()
         print('\n\n\t\t\t    ADDING NEW O.P.D PATIENT RECORD')
         print('\t\t\t    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~')
-        add_Patient()
+        return partial(add_Patient, OPD)
     elif newPatientChoice == 2:
         headTitle()
         print('\n\n\t\t\tADDING NEW EMERGENCY PATIENT RECORD')
         print('\t\t\t~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~')
-        add_Patient()
+        return partial(add_Patient, EMERGENCY)
     elif newPatientChoice == 3:
-        optionMenu()
+        return optionMenu
     else:
         print('\t\t\t    Invalid Input!, Try again!')
         time.sleep(2)   # Displaying the message for 2 seconds
-        addRecord()
+        return addRecord
 
 
 def searchContinue():   # To ask user to continue or quit
@@ -152,43 +138,75 @@ def searchContinue():   # To ask user to continue or quit
         '\n\n\t\tEnter (c) to continue or (q) to quit to main menu. ', allowRegexes=[r'[(^c$)|(^q$)]'])
     # Jumping to respective functions
     if endChoice == 'c':
-        searcheditRecord()
+        return searcheditRecord
     elif endChoice == 'q':
-        optionMenu()
+        return optionMenu
     else:
         print('\n\t\t\t\tInvalid number, Type again!')
         time.sleep(2)
-        searchContinue()
+        return searchContinue
+
+
+def displayPatient(record):  # To display one patient record
+    print()
+    for field, value in record.items():
+        print('\t\t\t    ' + field + ': ' + str(value))
 
 
 def search_Patient():   # To search records
     headTitle()
     print('\n\n\t\t\t      SEARCHING PATIENT RECORD')
     print('\t\t\t      ~~~~~~~~~~~~~~~~~~~~~~~~')
-    # Opening the file
-    recordFile = open('PatientRecords.py', 'r+')
-    # Reading the contents of the file for Regex
-    fileContent = str(recordFile.readlines())
     # Taking in the patient number
     patientNum = pyip.inputInt(
-        '\n\n\n\t\t\tEnter the patient no. to search: ', max=10)
-    # Searching the file for matches
-    fileRegex = re.findall(pattern='patient[1-9]0? ', string=fileContent)
-    try:
+        '\n\n\n\t\t\tEnter the patient no. to search: ', min=1)
+    # Looking the patient up by number
+    record = store.get(patientNum)
+    if record is not None:
         # Displaying the patient records
-        if 'patient'+str(patientNum)+' ' in fileRegex:
-            PatientRecords.display_Record(patientNum)
-        else:
-            print('\n\t\t\t\tInvalid number, Type again!')
-            time.sleep(2)
-            search_Patient()
-    except:
+        displayPatient(record)
+    else:
         print('\n\t\t\t\tInvalid number, Type again!')
         time.sleep(2)
-        search_Patient()
-    # Closing the file
-    recordFile.close()
-    searchContinue()
+        return search_Patient
+    return searchContinue
+
+
+def displayMatches(records):  # To display the results of a search
+    if not records:
+        print('\n\t\t\t\tNo matching records!')
+    for record in records:
+        displayPatient(record)
+    if len(records) == SEARCH_LIMIT:
+        print('\n\t\t\t    Showing the first', SEARCH_LIMIT, 'matches only.')
+
+
+def search_Name():  # To search records by the start of the name
+    headTitle()
+    print('\n\n\t\t\t      SEARCHING PATIENT BY NAME')
+    print('\t\t\t      ~~~~~~~~~~~~~~~~~~~~~~~~~')
+    name = pyip.inputStr('\n\n\n\t\t\tEnter the name (or its beginning): ')
+    displayMatches(store.search_name(name))
+    return searchContinue
+
+
+def search_Room():  # To search records by referred specialist room
+    headTitle()
+    print('\n\n\t\t\t      SEARCHING PATIENT BY SPECIALIST')
+    print('\t\t\t      ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~')
+    specialistMenu()
+    room = pyip.inputInt('\n\n\t\t\tEnter the room no.: ', min=1)
+    displayMatches(store.search_room(room))
+    return searchContinue
+
+
+def search_Disease():  # To search records by words in the disease description
+    headTitle()
+    print('\n\n\t\t\t      SEARCHING PATIENT BY DISEASE')
+    print('\t\t\t      ~~~~~~~~~~~~~~~~~~~~~~~~~~~~')
+    keywords = pyip.inputStr('\n\n\n\t\t\tEnter the disease keywords: ')
+    displayMatches(store.search_disease(keywords))
+    return searchContinue
 
 
 def editContinue():  # To ask user to continue or quit
@@ -197,13 +215,13 @@ def editContinue():  # To ask user to continue or quit
         '\n\n\t\tEnter (c) to continue or (q) to quit to main menu. ', allowRegexes=[r'[(^c$)|(^q$)]'])
     # Jumping to respective functions
     if endChoice == 'c':
-        searcheditRecord()
+        return searcheditRecord
     elif endChoice == 'q':
-        optionMenu()
+        return optionMenu
     else:
         print('\n\t\t\t\tInvalid number, Type again!')
         time.sleep(2)
-        editContinue()
+        return editContinue
 
 
 def editMenu(num):
@@ -224,74 +242,75 @@ def editMenu(num):
     if editChoice == 1:
         change = pyip.inputStr(
             '\n\t\t\t    Enter the new Name: ', blockRegexes=[r'[^a-zA-Z]'])
-        PatientRecords.edit_Record(num, editChoice, change)
+        store.edit(num, editChoice, change)
     elif editChoice == 2:
         change = pyip.inputStr(
             '\n\t\t\t    Enter the new Address: ')
-        PatientRecords.edit_Record(num, editChoice, change)
+        store.edit(num, editChoice, change)
     elif editChoice == 3:
         change = pyip.inputInt(
             '\n\t\t\t    Enter the new Age: ')
-        PatientRecords.edit_Record(num, editChoice, change)
+        store.edit(num, editChoice, change)
     elif editChoice == 4:
         change = pyip.inputStr(
             '\n\t\t\t    Enter the new Sex: ', blockRegexes=[r'[^mf]'])
-        PatientRecords.edit_Record(num, editChoice, change)
+        store.edit(num, editChoice, change)
     elif editChoice == 5:
         change = pyip.inputStr(
             '\n\t\t\t    Enter the new Disease Description: ')
-        PatientRecords.edit_Record(num, editChoice, change)
+        store.edit(num, editChoice, change)
     elif editChoice == 6:
         change = pyip.inputInt(
             '\n\t\t\t    Enter the new Referred Specialist: ')
-        PatientRecords.edit_Record(num, editChoice, change)
+        store.edit(num, editChoice, change)
 
 
 def edit_Patient():  # To edit records
     headTitle()
     print('\n\n\t\t\t\tEDITING PATIENT RECORD')
     print('\t\t\t\t~~~~~~~~~~~~~~~~~~~~~~')
-    # Opening the file
-    recordFile = open('PatientRecords.py', 'r+')
-    # Reading the contents of the file for Regex
-    fileContent = str(recordFile.readlines())
-    # Searching the file for matches
-    fileRegex = re.findall(pattern='patient[1-9]0? ', string=fileContent)
     # Taking in the patient number
     patientNum = pyip.inputInt(
-        '\n\n\n\t\t\tEnter the patient no. to edit: ', max=10)
+        '\n\n\n\t\t\tEnter the patient no. to edit: ', min=1)
     # Editing the record
-    if 'patient'+str(patientNum)+' ' in fileRegex:
+    if store.exists(patientNum):
         editMenu(patientNum)
         print('\n\t\t\t    Record successfully edited!')
-        editContinue()
-    elif 'patient'+str(patientNum) not in fileRegex:
+        return editContinue
+    else:
         print('\n\t\t\t    Invalid number, Type again!')
         time.sleep(1)
-        edit_Patient()
-    # Closing the file
-    recordFile.close()
+        return edit_Patient
 
 
 def searcheditRecord():  # Menu for options to search or edit records
     headTitle()
     print('\n\n\n\n\t\t\t    Select one of the following:\n')
     # Displaying the options for searching or editing
-    print('\t\t\t    1. Search the records')
-    print('\t\t\t    2. Edit the records')
-    print('\t\t\t    3. Return to main menu.\n')
+    print('\t\t\t    1. Search by patient no.')
+    print('\t\t\t    2. Search by name')
+    print('\t\t\t    3. Search by referred specialist room')
+    print('\t\t\t    4. Search by disease')
+    print('\t\t\t    5. Edit the records')
+    print('\t\t\t    6. Return to main menu.\n')
     # Taking the input for choice
     seChoice = pyip.inputInt('\t\t\t    ')
     if seChoice == 1:
-        search_Patient()
+        return search_Patient
     elif seChoice == 2:
-        edit_Patient()
+        return search_Name
     elif seChoice == 3:
-        optionMenu()
+        return search_Room
+    elif seChoice == 4:
+        return search_Disease
+    elif seChoice == 5:
+        return edit_Patient
+    elif seChoice == 6:
+        return optionMenu
     else:
         print('\n\t\t\t\tInvalid number, Type again!')
         time.sleep(2)
-        searcheditRecord()
+        return searcheditRecord
 
 
 def displayContinue():  # To ask user to continue or quit
@@ -300,31 +319,50 @@ def displayContinue():  # To ask user to continue or quit
         '\n\n\t\tEnter (c) to continue or (q) to quit to main menu. ', allowRegexes=[r'[(^c$)|(^q$)]'])
     # Jumping to respective functions
     if endChoice == 'c':
-        displayRecord()
+        return displayRecord
     elif endChoice == 'q':
-        optionMenu()
+        return optionMenu
     else:
         print('\n\t\t\t\tInvalid number, Type again!')
         time.sleep(2)
-        displayContinue()
+        return displayContinue
 
 
-def displayRecord():    # To display all the records
+def displayRecord():    # To choose the order to list the records in
     headTitle()
-    # Opening the file
-    recordFile = open('PatientRecords.py', 'r+')
-    # Reading the contents of the file for Regex
-    fileContent = str(recordFile.readlines())
-    # Searching the file for matches
-    fileRegex = re.findall(pattern='patient', string=fileContent)
-    # Displaying the records
-    if 'patient' not in fileRegex:
+    if store.count() == 0:
         print('\n\n\t\t\t\tNo records available!')
-    else:
-        PatientRecords.display_All()
-    # Closing the file
-    recordFile.close()
-    displayContinue()
+        return displayContinue
+    print('\n\n\n\n\t\t\t    List the records by:\n')
+    print('\t\t\t    1. Patient no.')
+    print('\t\t\t    2. Name')
+    print('\t\t\t    3. Age')
+    print('\t\t\t    4. Referred specialist room\n')
+    sortChoice = pyip.inputInt('\t\t\t    ', min=1, max=4)
+    # Each page starts after the last record of the one before; the first starts at the beginning
+    return partial(displayPage, ('patient_no', 'name', 'age', 'room')[sortChoice - 1], [(0, None)])
+
+
+def displayPage(sort, starts):  # To display one page of the records
+    headTitle()
+    after_no, after_key = starts[-1]
+    # Reading one record more than a page tells whether there is a next page
+    records = store.page(after_no, PAGE_SIZE + 1, sort, after_key)
+    hasNext = len(records) > PAGE_SIZE
+    records = records[:PAGE_SIZE]
+    for record in records:
+        displayPatient(record)
+    pages = max(1, -(-store.count() // PAGE_SIZE))
+    print('\n\t\t\t    Page', len(starts), 'of', pages)
+    choices = (['n'] if hasNext else []) + (['p'] if len(starts) > 1 else []) + ['q']
+    pageChoice = pyip.inputChoice(choices, '\n\t\tEnter ' + ', '.join(
+        '(' + c + ') ' + {'n': 'for the next page', 'p': 'for the previous page', 'q': 'to quit'}[c]
+        for c in choices) + ': ')
+    if pageChoice == 'n':
+        return partial(displayPage, sort, starts + [page_position(records[-1], sort)])
+    elif pageChoice == 'p':
+        return partial(displayPage, sort, starts[:-1])
+    return displayContinue
 
 
 def deleteContinue():   # To ask user to continue or quit
@@ -333,38 +371,29 @@ def deleteContinue():   # To ask user to continue or quit
         '\n\n\t\tEnter (c) to continue or (q) to quit to main menu. ', allowRegexes=[r'[(^c$)|(^q$)]'])
     # Jumping to respective functions
     if endChoice == 'c':
-        deleteRecord()
+        return deleteRecord
     elif endChoice == 'q':
-        optionMenu()
+        return optionMenu
     else:
         print('\n\t\t\t\tInvalid number, Type again!')
         time.sleep(2)
-        deleteContinue()
+        return deleteContinue
 
 
 def delete_Patient():  # Menu for deleting a single record
     headTitle()
-    # Opening the file
-    recordFile = open('PatientRecords.py', 'r+')
-    # Reading the contents of the file for Regex
-    fileContent = str(recordFile.readlines())
-    # Searching the file for matches
-    fileRegex = re.findall(pattern='patient[1-9]\d?0?', string=fileContent)
     print('\n\n\t\t\t      DELETING A PATIENT RECORD')
     print('\t\t\t      ~~~~~~~~~~~~~~~~~~~~~~~~~')
     # Taking in the choice
     patientNum = pyip.inputInt(
-        '\n\n\t\t\tEnter the patient number to delete: ', max=100)
-    if 'patient'+str(patientNum) in fileRegex:
-        PatientRecords.delete_Record(patientNum)
+        '\n\n\t\t\tEnter the patient number to delete: ', min=1)
+    if store.delete(patientNum):
         print('\n\t\t\t     Record successfully deleted!')
-        deleteContinue()
+        return deleteContinue
     else:
         print('\n\t\t\t\tInvalid number, Type again!')
         time.sleep(2)
-        delete_Patient()
-    # Closing the file
-    recordFile.close()
+        return delete_Patient
 
 
 def deleteRecord():  # Menu for options to delete records
@@ -376,27 +405,92 @@ def deleteRecord():  # Menu for options to delete records
     print('\t\t\t    3. Return to main menu\n')
     # Taking in the input
     deletionChoice = pyip.inputInt('\t\t\t    ')
-    # Opening the file
-    recordFile = open('PatientRecords.py', 'r+')
-    # Reading the contents of the file for Regex
-    fileContent = str(recordFile.readlines())
-    # Searching the file for matches
-    fileRegex = re.findall(pattern='patient[1-9]0? ', string=fileContent)
-    # Deleting the key
+    # Deleting the records
     if deletionChoice == 1:
-        delete_Patient()
+        return delete_Patient
     elif deletionChoice == 2:
-        PatientRecords.delete_Record()
+        store.delete_all()
         print('\n\n\t\t\tDeleted all the records successfully!')
-        deleteContinue()
+        return deleteContinue
     elif deletionChoice == 3:
-        optionMenu()
+        return optionMenu
     else:
         print('\n\t\t\t\tInvalid number, Type again!')
         time.sleep(2)
-        deleteRecord()
-    # Closing the file
-    recordFile.close()
+        return deleteRecord
+
+
+def triageContinue():   # To ask user to continue or quit
+    # Displaying the end menu
+    endChoice = pyip.inputStr(
+        '\n\n\t\tEnter (c) to continue or (q) to quit to main menu. ', allowRegexes=[r'[(^c$)|(^q$)]'])
+    # Jumping to respective functions
+    if endChoice == 'c':
+        return triageMenu
+    elif endChoice == 'q':
+        return optionMenu
+    else:
+        print('\n\t\t\t\tInvalid number, Type again!')
+        time.sleep(2)
+        return triageContinue
+
+
+def showQueue():    # To display the waiting queue of a room
+    headTitle()
+    specialistMenu()
+    room = pyip.inputInt('\n\n\t\t\tEnter the room no.: ', min=1)
+    waiting = store.triage.queue(room)
+    if not waiting:
+        print('\n\t\t\t    No patients waiting for room', room)
+    for position, (number, priority) in enumerate(waiting, 1):
+        print('\t\t\t    ' + str(position) + '. Patient no.', number, '(' + PRIORITY_NAMES[priority] + ')')
+    return triageContinue
+
+
+def callNext():     # To call the next patient waiting for a room
+    headTitle()
+    specialistMenu()
+    room = pyip.inputInt('\n\n\t\t\tEnter the room no.: ', min=1)
+    number = store.triage.next_patient(room)
+    if number is None:
+        print('\n\t\t\t    No patients waiting for room', room)
+    else:
+        print('\n\t\t\t    Next patient for room', room, '-', store.triage.size(room), 'still waiting')
+        displayPatient(store.get(number))
+    return triageContinue
+
+
+def changePriority():   # To move a waiting patient between O.P.D and Emergency
+    headTitle()
+    number = pyip.inputInt('\n\n\n\t\t\tEnter the patient no.: ', min=1)
+    priorityChoice = pyip.inputInt('\n\t\t\t    1. O.P.D\n\t\t\t    2. Emergency\n\t\t\t    ', min=1, max=2)
+    if store.triage.reprioritize(number, EMERGENCY if priorityChoice == 2 else OPD):
+        print('\n\t\t\t    Priority changed successfully!')
+    else:
+        print('\n\t\t\t    Patient', number, 'is not waiting in any queue!')
+    return triageContinue
+
+
+def triageMenu():   # Menu for the specialist waiting queues
+    headTitle()
+    print('\n\n\n\n\t\t\t    Select one of the following:\n')
+    print('\t\t\t    1. Show the waiting queue of a room')
+    print('\t\t\t    2. Call the next patient of a room')
+    print('\t\t\t    3. Change the priority of a waiting patient')
+    print('\t\t\t    4. Return to main menu.\n')
+    triageChoice = pyip.inputInt('\t\t\t    ')
+    if triageChoice == 1:
+        return showQueue
+    elif triageChoice == 2:
+        return callNext
+    elif triageChoice == 3:
+        return changePriority
+    elif triageChoice == 4:
+        return optionMenu
+    else:
+        print('\n\t\t\t\tInvalid number, Type again!')
+        time.sleep(2)
+        return triageMenu
 
 
 def optionMenu():  # The options in the main menu
@@ -407,26 +501,91 @@ def optionMenu():  # The options in the main menu
     print('\t\t\t    2. Search or edit record')
     print("\t\t\t    3. Know the Patient's record")
     print('\t\t\t    4. Delete the record')
-    print('\t\t\t    5. Exit from the program\n')
+    print('\t\t\t    5. Specialist waiting queues')
+    print('\t\t\t    6. Exit from the program\n')
     # Taking in the choice from user
     optionChoice = pyip.inputInt('\t\t\t    ')
     # Checking the optionChoice
     if optionChoice == 1:
-        addRecord()
+        return addRecord
     elif optionChoice == 2:
-        searcheditRecord()
+        return searcheditRecord
     elif optionChoice == 3:
-        displayRecord()
+        return displayRecord
     elif optionChoice == 4:
-        deleteRecord()
+        return deleteRecord
     elif optionChoice == 5:
+        return triageMenu
+    elif optionChoice == 6:
         os.system('cls')    # Clearing the screen
-        os.system('exit')   # Existing the program
+        return None         # Exiting the program
     else:
         print('\t\t\t    Invalid Input!, Try again!')
         time.sleep(2)   # Displaying the message for 2 seconds
-        optionMenu()
+        return optionMenu
+
+
+def transferRecords(args):  # To import or export records from the command line
+    if args.import_csv:
+        try:
+            added, errors = import_csv(store, args.import_csv,
+                                       lambda count: print('Added', count, 'records...', end='\r', flush=True))
+        except (OSError, ValueError) as e:
+            print('Cannot import', args.import_csv + ':', e, file=sys.stderr)
+            return 1
+        print('Added', added, 'records from', args.import_csv)
+        # Listing every rejected row, so they can be fixed and imported again
+        for line, error in errors:
+            print(args.import_csv + ':' + str(line) + ':', error, file=sys.stderr)
+        if errors:
+            print('Skipped', len(errors), 'invalid rows', file=sys.stderr)
+            return 1
+    if args.export_csv:
+        print('Saved', export_csv(store, args.export_csv, args.sort), 'records to', args.export_csv)
+    return 0
+
+
+def main(argv=None):
+    # Each menu returns the next menu to show (or None to exit) instead of calling it,
+    # so the stack stays the same depth however long the program runs
+    parser = argparse.ArgumentParser(description='Hospital Management System')
+    parser.add_argument('--server', metavar='ADDRESS',
+                        help='Use the records of a PatientServer (host:port or socket path) instead of the local database')
+    parser.add_argument('--import-csv', metavar='FILE', help='Add the patient records in a CSV file and exit')
+    parser.add_argument('--export-csv', metavar='FILE', help='Save every patient record to a CSV file and exit')
+    parser.add_argument('--sort', choices=sorted(SORT_ORDERS), default='patient_no',
+                        help='Order of the exported records (default: %(default)s)')
+    args = parser.parse_args(argv)
+    if args.import_csv and args.server:
+        parser.error('--import-csv works on the local database only')
+    global store
+    maintenance = None
+    if args.server:
+        store = RecordClient(args.server)  # Connecting to the shared record store
+    else:
+        store = PatientStore()  # Opening the record store
+    try:
+        if not args.server:
+            # Moving any records left in PatientRecords.py into it
+            _, skipped = migrate_patient_records(store)
+            if skipped:
+                print('Not migrated, patient no. already in use:', ', '.join(map(str, skipped)), file=sys.stderr)
+            maintenance = StoreMaintenance().start()  # Checkpointing and snapshotting it in the background
+        if args.import_csv or args.export_csv:
+            status = transferRecords(args)
+        else:
+            status = 0
+            state = optionMenu
+            while state is not None:
+                state = state()
+    finally:
+        # Also on Ctrl+C or an error, so the log is truncated and the store closed cleanly
+        if maintenance is not None:
+            maintenance.stop()
+        store.close()
+    return status
 
 
 # Start of program
-optionMenu()
+if __name__ == '__main__':
+    sys.exit(main())
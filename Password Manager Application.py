@@ -4,270 +4,429 @@ try:
 except ImportError:
     from tkinter import *
 
-import sqlite3
+from tkinter import filedialog
 from tkinter import messagebox
-
-root = Tk()
-root.title("Password Manager")
-root.geometry("500x400")
-root.minsize(600, 400)
-root.maxsize(600, 400)
-
-frame = Frame(root, bg="#80c1ff", bd=5)
-frame.place(relx=0.50, rely=0.50, relwidth=0.98, relheight=0.45, anchor = "n")
-
-#Create Database
-conn = sqlite3.connect("passmanager.db")
-cursor = conn.cursor()
-
-#Create table
-cursor.execute(""" CREATE TABLE IF NOT EXISTS manager (
-                       app_name text,
-                        url text,
-                        email_id text,
-                        password text
-                        )
-""")
-
-# Commit changes
-conn.commit()
-# Close connection
-conn.close()
+from tkinter import simpledialog
+from tkinter import ttk
+from PasswordVault import VaultWorker, WrongPassword, PAGE_SIZE, import_file, export_file
+
+#Run a vault call on the worker; callback gets the result on the Tk thread
+def run_db(func, *args, callback=None, progress=None, on_error=None, cancellable=True):
+    job = worker.submit(func, *args, callback=callback, on_error=on_error or show_db_error, progress=progress,
+                        cancellable=cancellable)
+    busy_bar.start(10)
+    cancel_btn.configure(state=NORMAL)
+    return job
+
+def show_db_error(error):
+    messagebox.showerror("Error", "Database error: %s" %error)
+
+#Deliver finished results and update the busy indicator
+def poll_db():
+    #Reschedule even if a callback raises, or no more results would ever be handled
+    try:
+        if not worker.poll():
+            busy_bar.stop()
+            cancel_btn.configure(state=DISABLED)
+            status_label.configure(text="")
+    finally:
+        root.after(50, poll_db)
+
+#Cancel the running and queued database calls (unlocking is never cancelled)
+def cancel_db():
+    worker.cancel_all()
+
+#Ask for the master password and unlock the vault (the key is derived once per session)
+#These jobs can't be cancelled: the window is unusable until the vault is unlocked
+def unlock_vault():
+    run_db(vault.is_initialized, callback=ask_master_password, cancellable=False)
+
+def ask_master_password(initialized):
+    if initialized:
+        master = simpledialog.askstring("Unlock Vault", "Master Password:", show="*", parent=root)
+    else:
+        master = simpledialog.askstring("Create Vault", "Choose a Master Password:", show="*", parent=root)
+        if master is not None and master != simpledialog.askstring("Create Vault", "Confirm Master Password:",
+                                                                   show="*", parent=root):
+            messagebox.showinfo("Alert", "Passwords do not match!")
+            root.after(0, ask_master_password, initialized)
+            return
+    if not master:
+        root.destroy()
+        return
+    status_label.configure(text="Unlocking...")
+    run_db(vault.unlock, master, on_error=unlock_failed, cancellable=False)
+
+def unlock_failed(error):
+    if isinstance(error, WrongPassword):
+        messagebox.showinfo("Alert", "Wrong master password!")
+        root.after(0, ask_master_password, True)
+    else:
+        show_db_error(error)
+        root.destroy()
 
 #Create Table Structure for displaying data
 
 #Create submit function for database
 def submit():
-    #connect to database
-    conn = sqlite3.connect("passmanager.db")
-    cursor = conn.cursor()
-
     #Insert Into Table
     if app_name.get()!="" and url.get()!="" and email_id.get()!="" and password.get()!="":
-        cursor.execute("INSERT INTO manager VALUES (:app_name, :url, :email_id, :password)",
-            {
-                'app_name': app_name.get(),
-                'url': url.get(),
-                'email_id': email_id.get(),
-                'password': password.get()
-            }
-        )
-        # Commit changes
-        conn.commit()
-        # Close connection
-        conn.close()
-        # Message box
-        messagebox.showinfo("Info", "Record Added in Database!")
-
-        # After data entry clear the text boxes
-        app_name.delete(0, END)
-        url.delete(0, END)
-        email_id.delete(0, END)
-        password.delete(0, END)
+        run_db(vault.add, app_name.get(), url.get(), email_id.get(), password.get(), callback=added)
 
     else:
         messagebox.showinfo("Alert", "Please fill all details!")
-        conn.close()
+
+def added(oid):
+    # Message box
+    messagebox.showinfo("Info", "Record Added in Database!")
+
+    # After data entry clear the text boxes
+    app_name.delete(0, END)
+    url.delete(0, END)
+    email_id.delete(0, END)
+    password.delete(0, END)
 
 # Create Query Function
 def query():
     #set button text
     query_btn.configure(text="Hide Records", command=hide)
-    # connect to database
-    conn = sqlite3.connect("passmanager.db")
-    cursor = conn.cursor()
 
-    #Query the database
-    cursor.execute("SELECT *, oid FROM manager")
-    records = cursor.fetchall()
-    #print(records)
-
-    p_records = ""
+    #Load the first page; the rest is fetched as the user scrolls
+    clear_records()
+    load_next_page()
+
+#Record list state: the last id loaded, whether more pages follow and the fetch in flight
+last_loaded_id = 0
+more_records = False
+list_job = None
+
+def clear_records():
+    global last_loaded_id, more_records, list_job
+    if list_job is not None:
+        worker.cancel(list_job)
+        list_job = None
+    records_tree.delete(*records_tree.get_children())
+    last_loaded_id = 0
+    more_records = False
+
+def load_next_page():
+    global list_job
+    if list_job is None:
+        list_job = run_db(vault.page, last_loaded_id, callback=page_loaded)
+
+def page_loaded(records):
+    global last_loaded_id, more_records, list_job
+    list_job = None
+    show_records(records)
+    if records:
+        last_loaded_id = records[-1][0]
+    more_records = len(records) == PAGE_SIZE
+
+#Display records in the record list (passwords stay encrypted until revealed)
+PASSWORD_MASK = "\u2022" * 8
+
+def show_records(records):
     for record in records:
-            p_records += str(record[4])+ " " +str(record[0])+ " " + str(record[1])+ " " + str(record[2]) + " " + str(record[3])+ "\n"
-        #print(record)
-
-    query_label['text'] = p_records
-    # Commit changes
-    conn.commit()
+        records_tree.insert("", END, iid=record[0], values=record + (PASSWORD_MASK,))
+
+#Create Functions to Reveal or Copy the password of the selected record
+CLIPBOARD_CLEAR_MS = 30000
+
+def selected_record():
+    selection = records_tree.selection()
+    if not selection:
+        messagebox.showinfo("Alert", "Please select a record!")
+        return None
+    return selection[0]
+
+def reveal_password():
+    item = selected_record()
+    if item is not None:
+        run_db(vault.reveal, int(item), callback=lambda secret: records_tree.set(item, "password", secret or ""))
+
+def copy_password():
+    item = selected_record()
+    if item is not None:
+        run_db(vault.reveal, int(item), callback=copy_to_clipboard)
+
+def copy_to_clipboard(secret):
+    if secret is None:
+        return
+    root.clipboard_clear()
+    root.clipboard_append(secret)
+    status_label.configure(text="Password copied")
+    root.after(CLIPBOARD_CLEAR_MS, lambda: clear_clipboard(secret))
+
+def clear_clipboard(secret):
+    #Only clear the clipboard if it still holds the copied password
+    try:
+        if root.clipboard_get() == secret:
+            root.clipboard_clear()
+    except TclError:
+        pass
+
+#Fetch the next page when the list is scrolled near its end
+def on_records_scroll(first, last):
+    records_scrollbar.set(first, last)
+    if more_records and float(last) > 0.9:
+        load_next_page()
+
+#Create Search Function (runs shortly after the user stops typing)
+search_job = None
+def schedule_search(event=None):
+    global search_job
+    if search_job is not None:
+        root.after_cancel(search_job)
+    search_job = root.after(150, search)
+
+def search():
+    global search_job
+    search_job = None
+    if search_text.get().strip() == "":
+        hide()
+        return
+    query_btn.configure(text="Hide Records", command=hide)
+    clear_records()
+    #clear_records() cancels a search still running for older text
+    global list_job
+    list_job = run_db(vault.search, search_text.get(), callback=search_done)
 
-    # Close connection
-    conn.close()
+def search_done(records):
+    global list_job
+    list_job = None
+    show_records(records)
 
 #Create Function to Delete A Record
 def delete():
-    # connect to database
-    conn = sqlite3.connect("passmanager.db")
-    cursor = conn.cursor()
-
     #Query the database
     t = delete_id.get()
-    if(t!=""):
-        cursor.execute("DELETE FROM manager where oid = " + delete_id.get())
-        delete_id.delete(0, END)
-        messagebox.showinfo("Alert", "Record %s Deleted" %t)
+    if(t.isdigit()):
+        run_db(vault.delete, int(t), callback=lambda found: deleted(t, found))
     else:
         messagebox.showinfo("Alert", "Please enter record id to delete!")
 
-    # Commit changes
-    conn.commit()
-
-    # Close connection
-    conn.close()
+def deleted(t, found):
+    if found:
+        delete_id.delete(0, END)
+        messagebox.showinfo("Alert", "Record %s Deleted" %t)
+    else:
+        messagebox.showinfo("Alert", "Record %s not found!" %t)
 
 #Create Function to Update A Record
 def update():
     t = update_id.get()
-    if(t!=""):
-        global edit
-        edit = Tk()
-        edit.title("Update Record")
-        edit.geometry("500x400")
-        edit.minsize(450, 300)
-        edit.maxsize(450, 300)
-
-        #Global variables
-        global app_name_edit, url_edit, email_id_edit, password_edit
-
-        # Create Text Boxes
-        app_name_edit = Entry(edit, width=30)
-        app_name_edit.grid(row=0, column=1, padx=20)
-        url_edit = Entry(edit, width=30)
-        url_edit.grid(row=1, column=1, padx=20)
-        email_id_edit = Entry(edit, width=30)
-        email_id_edit.grid(row=2, column=1, padx=20)
-        password_edit = Entry(edit, width=30)
-        password_edit.grid(row=3, column=1, padx=20)
-
-        # Create Text Box Labels
-        app_name_label_edit = Label(edit, text="Application Name:")
-        app_name_label_edit.grid(row=0, column=0)
-        url_label_edit = Label(edit, text="URL:")
-        url_label_edit.grid(row=1, column=0)
-        email_id_label_edit = Label(edit, text="Email Id:")
-        email_id_label_edit.grid(row=2, column=0)
-        password_label_edit = Label(edit, text="Password:")
-        password_label_edit.grid(row=3, column=0)
-
-        # Create Save Button
-        submit_btn_edit = Button(edit, text="Save Record", command=change)
-        submit_btn_edit.grid(row=4, column=0, columnspan=2, pady=5, padx=15, ipadx=135)
-
-        # connect to database
-        conn = sqlite3.connect("passmanager.db")
-        cursor = conn.cursor()
-
+    if(t.isdigit()):
         # Query the database
-        cursor.execute("SELECT * FROM manager where oid = " + update_id.get())
-        records = cursor.fetchall()
-
-        for record in records:
-            app_name_edit.insert(0, record[0])
-            url_edit.insert(0, record[1])
-            email_id_edit.insert(0, record[2])
-            password_edit.insert(0, record[3])
-
-        # Commit changes
-        conn.commit()
-
-        # Close connection
-        conn.close()
-
+        run_db(vault.get, int(t), callback=lambda record: open_editor(t, record))
     else:
         messagebox.showinfo("Alert", "Please enter record id to update!")
 
+#Open the edit window once the record has been fetched
+def open_editor(t, record):
+    if record is None:
+        messagebox.showinfo("Alert", "Record %s not found!" %t)
+        return
+
+    global edit
+    edit = Tk()
+    edit.title("Update Record")
+    edit.geometry("500x400")
+    edit.minsize(450, 300)
+    edit.maxsize(450, 300)
+
+    #Global variables
+    global app_name_edit, url_edit, email_id_edit, password_edit
+
+    # Create Text Boxes
+    app_name_edit = Entry(edit, width=30)
+    app_name_edit.grid(row=0, column=1, padx=20)
+    url_edit = Entry(edit, width=30)
+    url_edit.grid(row=1, column=1, padx=20)
+    email_id_edit = Entry(edit, width=30)
+    email_id_edit.grid(row=2, column=1, padx=20)
+    password_edit = Entry(edit, width=30)
+    password_edit.grid(row=3, column=1, padx=20)
+
+    # Create Text Box Labels
+    app_name_label_edit = Label(edit, text="Application Name:")
+    app_name_label_edit.grid(row=0, column=0)
+    url_label_edit = Label(edit, text="URL:")
+    url_label_edit.grid(row=1, column=0)
+    email_id_label_edit = Label(edit, text="Email Id:")
+    email_id_label_edit.grid(row=2, column=0)
+    password_label_edit = Label(edit, text="Password:")
+    password_label_edit.grid(row=3, column=0)
+
+    # Create Save Button
+    submit_btn_edit = Button(edit, text="Save Record", command=change)
+    submit_btn_edit.grid(row=4, column=0, columnspan=2, pady=5, padx=15, ipadx=135)
+
+    app_name_edit.insert(0, record[1])
+    url_edit.insert(0, record[2])
+    email_id_edit.insert(0, record[3])
+    password_edit.insert(0, record[4])
+
 #Create function to save update records
 def change():
-    #connect to database
-    conn = sqlite3.connect("passmanager.db")
-    cursor = conn.cursor()
-
-    #Insert Into Table
+    #Update the record
     if app_name_edit.get()!="" and url_edit.get()!="" and email_id_edit.get()!="" and password_edit.get()!="":
-        cursor.execute("""UPDATE manager SET
-                app_name = :app_name,
-                url = :url,
-                email_id = :email_id,
-                password = :password
-
-                WHERE oid = :oid""",
-                       {
-                           'app_name': app_name_edit.get(),
-                           'url': url_edit.get(),
-                           'email_id': email_id_edit.get(),
-                           'password': password_edit.get(),
-                           'oid': update_id.get()
-                       }
-        )
-        # Commit changes
-        conn.commit()
-        # Close connection
-        conn.close()
-        # Message box
-        messagebox.showinfo("Info", "Record Updated in Database!")
-
-        # After data entry clear the text box and destroy the secondary window
-        update_id.delete(0, END)
-        edit.destroy()
+        run_db(vault.update, int(update_id.get()), app_name_edit.get(), url_edit.get(), email_id_edit.get(),
+                     password_edit.get(), callback=changed)
 
     else:
         messagebox.showinfo("Alert", "Please fill all details!")
-        conn.close()
+
+def changed(found):
+    if not found:
+        messagebox.showinfo("Alert", "Record %s not found!" %update_id.get())
+        return
+    # Message box
+    messagebox.showinfo("Info", "Record Updated in Database!")
+
+    # After data entry clear the text box and destroy the secondary window
+    update_id.delete(0, END)
+    edit.destroy()
+
+#Create Import and Export Functions (the file is read or written on the worker thread)
+EXPORT_FORMATS = {"CSV": "csv", "JSON": "json", "Chrome CSV": "chrome", "Firefox CSV": "firefox"}
+
+def show_progress(count):
+    status_label.configure(text="%d records..." %count)
+
+def import_records():
+    path = filedialog.askopenfilename(title="Import Records",
+                                      filetypes=[("CSV or JSON", "*.csv *.json"), ("All files", "*.*")])
+    if path:
+        status_label.configure(text="Importing...")
+        run_db(import_file, vault, path, callback=imported, progress=show_progress)
+
+def imported(count):
+    status_label.configure(text="")
+    messagebox.showinfo("Info", "%d Records Imported!" %count)
+
+def export_records():
+    fmt = EXPORT_FORMATS[export_format.get()]
+    extension = ".json" if fmt == "json" else ".csv"
+    path = filedialog.asksaveasfilename(title="Export Records", defaultextension=extension,
+                                        filetypes=[(export_format.get(), "*" + extension)])
+    if path:
+        status_label.configure(text="Exporting...")
+        run_db(export_file, vault, path, fmt, callback=exported, progress=show_progress)
+
+def exported(count):
+    status_label.configure(text="")
+    messagebox.showinfo("Info", "%d Records Exported!" %count)
 
 #Create Function to Hide Records
 def hide():
-    query_label['text'] = ""
+    clear_records()
     query_btn.configure(text="Show Records", command=query)
 
 
-#Create Text Boxes
-app_name = Entry(root, width=30)
-app_name.grid(row=0, column=1, padx=20)
-url = Entry(root, width=30)
-url.grid(row=1, column=1, padx=20)
-email_id = Entry(root, width=30)
-email_id.grid(row=2, column=1, padx=20)
-password = Entry(root, width=30)
-password.grid(row=3, column=1, padx=20)
-delete_id = Entry(root, width=20)
-delete_id.grid(row=6, column=1, padx=20)
-update_id = Entry(root, width=20)
-update_id.grid(row=7, column=1, padx=20)
-
-#Create Text Box Labels
-app_name_label = Label(root, text = "Application Name:")
-app_name_label.grid(row=0, column=0)
-url_label = Label(root, text = "URL:")
-url_label.grid(row=1, column=0)
-email_id_label = Label(root, text = "Email Id:")
-email_id_label.grid(row=2, column=0)
-password_label = Label(root, text = "Password:")
-password_label.grid(row=3, column=0)
-
-
-#Create Submit Button
-submit_btn = Button(root, text = "Add Record", command = submit)
-submit_btn.grid(row = 5, column=0, pady=5, padx=15, ipadx=35)
-
-#Create a Query Button
-query_btn = Button(root, text = "Show Records", command = query)
-query_btn.grid(row=5, column=1, pady=5, padx=5, ipadx=35)
-
-#Create a Delete Button
-delete_btn = Button(root, text = "Delete Record", command = delete)
-delete_btn.grid(row=6, column=0, ipadx=30)
-
-#Create a Update Button
-update_btn = Button(root, text = "Update Record", command = update)
-update_btn.grid(row=7, column=0, ipadx=30)
-
-#Create a Label to show responses
-global query_label
-query_label = Label(frame, anchor="nw", justify="left")
-query_label.place(relwidth=1, relheight=1)
+#Create the window, its widgets and the database worker (nothing is created at import time)
+def build_window():
+    global root, frame, worker, vault
+    global app_name, url, email_id, password, delete_id, update_id, search_text
+    global query_btn, busy_bar, cancel_btn, status_label, export_format, records_tree, records_scrollbar
+    root = Tk()
+    root.title("Password Manager")
+    root.geometry("500x400")
+    root.minsize(600, 400)
+    root.maxsize(600, 400)
+
+    frame = Frame(root, bg="#80c1ff", bd=5)
+    frame.place(relx=0.50, rely=0.50, relwidth=0.98, relheight=0.45, anchor = "n")
+
+    #Open Database on a background thread (one connection for the whole session)
+    worker = VaultWorker()
+    vault = worker.vault
+
+    #Create Text Boxes
+    app_name = Entry(root, width=30)
+    app_name.grid(row=0, column=1, padx=20)
+    url = Entry(root, width=30)
+    url.grid(row=1, column=1, padx=20)
+    email_id = Entry(root, width=30)
+    email_id.grid(row=2, column=1, padx=20)
+    password = Entry(root, width=30)
+    password.grid(row=3, column=1, padx=20)
+    delete_id = Entry(root, width=20)
+    delete_id.grid(row=6, column=1, padx=20)
+    update_id = Entry(root, width=20)
+    update_id.grid(row=7, column=1, padx=20)
+    search_text = Entry(root, width=25)
+    search_text.grid(row=1, column=2, padx=10)
+    search_text.bind("<KeyRelease>", schedule_search)
+
+    #Create Text Box Labels
+    app_name_label = Label(root, text = "Application Name:")
+    app_name_label.grid(row=0, column=0)
+    url_label = Label(root, text = "URL:")
+    url_label.grid(row=1, column=0)
+    email_id_label = Label(root, text = "Email Id:")
+    email_id_label.grid(row=2, column=0)
+    password_label = Label(root, text = "Password:")
+    password_label.grid(row=3, column=0)
+    search_label = Label(root, text = "Search:")
+    search_label.grid(row=0, column=2)
+
+
+    #Create Submit Button
+    submit_btn = Button(root, text = "Add Record", command = submit)
+    submit_btn.grid(row = 5, column=0, pady=5, padx=15, ipadx=35)
+
+    #Create a Query Button
+    query_btn = Button(root, text = "Show Records", command = query)
+    query_btn.grid(row=5, column=1, pady=5, padx=5, ipadx=35)
+
+    #Create a Delete Button
+    delete_btn = Button(root, text = "Delete Record", command = delete)
+    delete_btn.grid(row=6, column=0, ipadx=30)
+
+    #Create a Update Button
+    update_btn = Button(root, text = "Update Record", command = update)
+    update_btn.grid(row=7, column=0, ipadx=30)
+
+    #Create a Busy Indicator and a Cancel Button for database calls
+    busy_bar = ttk.Progressbar(root, mode="indeterminate", length=150)
+    busy_bar.grid(row=3, column=2, padx=10)
+    cancel_btn = Button(root, text = "Cancel", command = cancel_db, state=DISABLED)
+    cancel_btn.grid(row=5, column=2, pady=5)
+    status_label = Label(root, text = "")
+    status_label.grid(row=4, column=2)
+
+    #Create Import and Export Buttons
+    export_format = ttk.Combobox(root, values=list(EXPORT_FORMATS), state="readonly", width=12)
+    export_format.set("CSV")
+    export_format.grid(row=2, column=2)
+    import_btn = Button(root, text = "Import Records", command = import_records)
+    import_btn.grid(row=6, column=2, ipadx=10)
+    export_btn = Button(root, text = "Export Records", command = export_records)
+    export_btn.grid(row=7, column=2, ipadx=10)
+
+    #Create a Record List to show responses
+    records_tree = ttk.Treeview(frame, columns=("id", "app_name", "url", "email_id", "password"), show="headings")
+    for column, heading, width in (("id", "ID", 50), ("app_name", "Application Name", 120), ("url", "URL", 150),
+                                   ("email_id", "Email Id", 130), ("password", "Password", 100)):
+        records_tree.heading(column, text=heading)
+        records_tree.column(column, width=width, stretch=True)
+    password_bar = Frame(frame, bg="#80c1ff")
+    password_bar.pack(side=BOTTOM, fill=X)
+    reveal_btn = Button(password_bar, text = "Reveal Password", command = reveal_password)
+    reveal_btn.pack(side=LEFT, padx=5)
+    copy_btn = Button(password_bar, text = "Copy Password", command = copy_password)
+    copy_btn.pack(side=LEFT, padx=5)
+    records_scrollbar = Scrollbar(frame, orient=VERTICAL, command=records_tree.yview)
+    records_tree.configure(yscrollcommand=on_records_scroll)
+    records_scrollbar.pack(side=RIGHT, fill=Y)
+    records_tree.pack(side=LEFT, fill=BOTH, expand=True)
 
 def main():
+    build_window()
+    root.after(0, unlock_vault)
+    root.after(50, poll_db)
     root.mainloop()
+    worker.close()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,686 @@
+'''
+Data access layer for the Password Manager.
+
+Keeps one long-lived sqlite connection to the vault in WAL mode and runs every
+query as a parameterized statement, so sqlite can reuse the compiled statement
+instead of parsing SQL on each call.
+
+Passwords are encrypted one by one with AES-GCM under a key derived from the
+master password with scrypt. The key is derived once, when the vault is
+unlocked, and kept for the session. Listing and searching read only the
+unencrypted name, URL and email columns; a password is decrypted only when a
+single record is asked for.
+'''
+
+import csv
+import hashlib
+import itertools
+import os
+import json
+import queue
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+DB_FILE = "passmanager.db"
+
+# Connection settings applied once when the vault is opened
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",        # Readers don't block the writer and commits append to the log
+    "PRAGMA synchronous = NORMAL",      # Safe with WAL; skips an fsync per commit
+    "PRAGMA busy_timeout = 5000",       # Wait for a lock instead of failing immediately
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",       # 16 MB page cache
+)
+
+# Schema versions, tracked in PRAGMA user_version:
+#   0 - the original table, keyed by the implicit rowid
+#   1 - explicit INTEGER PRIMARY KEY, indexes on every searchable column and an FTS5 index
+#   2 - vault_meta table for the key derivation settings; passwords stored encrypted
+SCHEMA_VERSION = 2
+
+# Key derivation (scrypt, ~0.1 s and 32 MB) and encryption settings for new vaults
+SCRYPT_N = 1 << 15
+SCRYPT_R = 8
+SCRYPT_P = 1
+SCRYPT_MAXMEM = 64 * 1024 * 1024
+SALT_SIZE = 16
+NONCE_SIZE = 12
+# Encrypted with the derived key when the vault is created, to check the master password on unlock
+VERIFIER = b"PasswordVault"
+
+# Statements are kept as constants so the connection's statement cache reuses them
+CREATE_TABLE = """CREATE TABLE IF NOT EXISTS manager (
+                       id INTEGER PRIMARY KEY,
+                       app_name TEXT COLLATE NOCASE,
+                       url TEXT COLLATE NOCASE,
+                       email_id TEXT COLLATE NOCASE,
+                       password TEXT
+                       )"""
+CREATE_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS manager_app_name ON manager (app_name)",
+    "CREATE INDEX IF NOT EXISTS manager_url ON manager (url)",
+    "CREATE INDEX IF NOT EXISTS manager_email_id ON manager (email_id)",
+)
+# Trigram tokens make MATCH a substring search; the table only stores the index, not a copy of the rows
+CREATE_FTS_INSERT_TRIGGER = """CREATE TRIGGER IF NOT EXISTS manager_fts_insert AFTER INSERT ON manager BEGIN
+           INSERT INTO manager_fts (rowid, app_name, url, email_id)
+           VALUES (new.id, new.app_name, new.url, new.email_id);
+       END"""
+# Only changes to the indexed columns touch the index (re-encrypting a password does not)
+CREATE_FTS_UPDATE_TRIGGER = """CREATE TRIGGER IF NOT EXISTS manager_fts_update AFTER UPDATE OF app_name, url, email_id ON manager BEGIN
+           INSERT INTO manager_fts (manager_fts, rowid, app_name, url, email_id)
+           VALUES ('delete', old.id, old.app_name, old.url, old.email_id);
+           INSERT INTO manager_fts (rowid, app_name, url, email_id)
+           VALUES (new.id, new.app_name, new.url, new.email_id);
+       END"""
+CREATE_FTS = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS manager_fts USING fts5(
+           app_name, url, email_id, content='manager', content_rowid='id', tokenize='trigram')""",
+    CREATE_FTS_INSERT_TRIGGER,
+    """CREATE TRIGGER IF NOT EXISTS manager_fts_delete AFTER DELETE ON manager BEGIN
+           INSERT INTO manager_fts (manager_fts, rowid, app_name, url, email_id)
+           VALUES ('delete', old.id, old.app_name, old.url, old.email_id);
+       END""",
+    CREATE_FTS_UPDATE_TRIGGER,
+    "INSERT INTO manager_fts (manager_fts) VALUES ('rebuild')",
+)
+CREATE_META = "CREATE TABLE IF NOT EXISTS vault_meta (key TEXT PRIMARY KEY, value BLOB)"
+SELECT_META = "SELECT value FROM vault_meta WHERE key = :key"
+INSERT_META = "INSERT OR REPLACE INTO vault_meta (key, value) VALUES (:key, :value)"
+# Rows written before the vault was encrypted still hold their password as text. Once they are encrypted
+# the PLAINTEXT_DONE key is set in vault_meta, so later unlocks skip the table scan.
+PLAINTEXT_DONE = 'plaintext_encrypted'
+SELECT_PLAINTEXT = "SELECT id, password FROM manager WHERE typeof(password) = 'text'"
+ENCRYPT_PASSWORD = "UPDATE manager SET password = ? WHERE id = ?"
+
+COPY_LEGACY_TABLE = """INSERT INTO manager (id, app_name, url, email_id, password)
+                       SELECT oid, app_name, url, email_id, password FROM manager_legacy"""
+
+INSERT_RECORDS = "INSERT INTO manager (app_name, url, email_id, password) VALUES (?, ?, ?, ?)"
+INSERT_RECORD = "INSERT INTO manager (app_name, url, email_id, password) VALUES (:app_name, :url, :email_id, :password)"
+SELECT_ALL = "SELECT id, app_name, url, email_id FROM manager"
+# Bulk imports index the new rows in one statement instead of through the per-row insert trigger
+DROP_FTS_INSERT_TRIGGER = "DROP TRIGGER IF EXISTS manager_fts_insert"
+INDEX_NEW_RECORDS = """INSERT INTO manager_fts (rowid, app_name, url, email_id)
+                       SELECT id, app_name, url, email_id FROM manager WHERE id > :after_id"""
+SELECT_MAX_ID = "SELECT coalesce(max(id), 0) FROM manager"
+SELECT_EXPORT = "SELECT app_name, url, email_id, password FROM manager ORDER BY id"
+SELECT_RECORD = "SELECT id, app_name, url, email_id, password FROM manager WHERE id = :oid"
+SELECT_PASSWORD = "SELECT password FROM manager WHERE id = :oid"
+UPDATE_RECORD = """UPDATE manager SET
+                       app_name = :app_name,
+                       url = :url,
+                       email_id = :email_id,
+                       password = :password
+                   WHERE id = :oid"""
+DELETE_RECORD = "DELETE FROM manager WHERE id = :oid"
+
+# Substring search through the trigram index (needs at least 3 characters)
+SEARCH_FTS = """SELECT m.id, m.app_name, m.url, m.email_id
+                FROM manager_fts JOIN manager m ON m.id = manager_fts.rowid
+                WHERE manager_fts MATCH :query LIMIT :limit"""
+# Prefix search through the B-tree index of each column, for queries too short for trigrams
+SEARCH_PREFIX = tuple(
+    """SELECT id, app_name, url, email_id FROM manager
+       WHERE %s LIKE :pattern ESCAPE '\\' LIMIT :limit""" % column
+    for column in ('app_name', 'url', 'email_id')
+)
+# Used when the sqlite build has no FTS5 trigram tokenizer
+SEARCH_SCAN = """SELECT id, app_name, url, email_id FROM manager
+                 WHERE app_name LIKE :pattern ESCAPE '\\' OR url LIKE :pattern ESCAPE '\\'
+                    OR email_id LIKE :pattern ESCAPE '\\'
+                 LIMIT :limit"""
+SEARCH_LIMIT = 200
+
+# Keyset pagination: continue after the last id shown instead of using OFFSET, so every page costs the same
+SELECT_PAGE = """SELECT id, app_name, url, email_id FROM manager
+                 WHERE id > :after_id ORDER BY id LIMIT :limit"""
+PAGE_SIZE = 100
+
+# Import/export: rows per executemany() batch and progress report, and characters read per JSON chunk
+IMPORT_CHUNK = 5000
+EXPORT_CHUNK = 5000
+JSON_READ_SIZE = 1 << 16
+JSON_SEPARATOR = re.compile(r'[\s,]*')
+
+# CSV headers accepted for each field on import (our own export, Chrome, Firefox, Bitwarden and similar)
+FIELD_ALIASES = {
+    'app_name': ('app_name', 'name', 'title'),
+    'url': ('url', 'login_uri', 'origin', 'website'),
+    'email_id': ('email_id', 'username', 'login_username', 'email', 'login'),
+    'password': ('password', 'login_password'),
+}
+# Export formats: the header written and the field each column holds ('' for columns we have no data for)
+EXPORT_FORMATS = {
+    'csv': (('app_name', 'url', 'email_id', 'password'), ('app_name', 'url', 'email_id', 'password')),
+    'chrome': (('name', 'url', 'username', 'password'), ('app_name', 'url', 'email_id', 'password')),
+    'firefox': (('url', 'username', 'password', 'httpRealm', 'formActionOrigin', 'guid', 'timeCreated',
+                 'timeLastUsed', 'timePasswordChanged'), ('url', 'email_id', 'password', '', '', '', '', '', '')),
+}
+RECORD_FIELDS = ('app_name', 'url', 'email_id', 'password')
+
+
+def escape_like(text):
+    '''Escape the LIKE wildcards in text.'''
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class VaultLocked(Exception):
+    '''Raised when passwords are read or written before the vault is unlocked.'''
+
+
+class WrongPassword(Exception):
+    '''Raised by Vault.unlock() when the master password does not match.'''
+
+
+class Cancelled(Exception):
+    '''Raised inside a worker job that was cancelled while it reported progress.'''
+
+
+def file_format(path, fmt=None):
+    '''Return fmt, or guess it from the file extension ('json' or 'csv').'''
+    if fmt:
+        return fmt
+    return 'json' if path.lower().endswith('.json') else 'csv'
+
+
+def record_from_fields(fields):
+    '''Build an (app_name, url, email_id, password) tuple from a dict of field values, or None if it has no password.'''
+    values = [(fields.get(name) or '').strip() for name in RECORD_FIELDS]
+    if not values[3]:
+        return None
+    if not values[0]:
+        # Firefox exports have no name column; fall back to the site's host name
+        values[0] = urlsplit(values[1]).hostname or values[1]
+    return tuple(values)
+
+
+def read_csv_records(f):
+    '''Yield records from a CSV file, matching its header against FIELD_ALIASES.'''
+    reader = csv.reader(f)
+    header = [column.strip().lower() for column in next(reader, [])]
+    columns = {}
+    for field, aliases in FIELD_ALIASES.items():
+        for alias in aliases:
+            if alias in header:
+                columns[field] = header.index(alias)
+                break
+    if 'password' not in columns:
+        raise ValueError("CSV file has no password column")
+    for row in reader:
+        record = record_from_fields({field: row[i] for field, i in columns.items() if i < len(row)})
+        if record is not None:
+            yield record
+
+
+def iter_json_array(f):
+    '''Yield the items of a JSON array one at a time, reading the file in chunks instead of all at once.'''
+    decoder = json.JSONDecoder()
+    buffer = f.read(JSON_READ_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError("JSON file must contain an array of records")
+    pos = 1
+    eof = False
+    while True:
+        pos = JSON_SEPARATOR.match(buffer, pos).end()
+        if buffer.startswith(']', pos):
+            return
+        try:
+            item, pos = decoder.raw_decode(buffer, pos)
+        except ValueError:
+            if eof:
+                raise
+            # The item runs past the end of the buffer: keep the unread part and read the next chunk
+            chunk = f.read(JSON_READ_SIZE)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield item
+
+
+def read_json_records(f):
+    '''Yield records from a JSON array of objects keyed by field name (or any alias in FIELD_ALIASES).'''
+    for item in iter_json_array(f):
+        item = {key.lower(): value for key, value in item.items()}
+        fields = {}
+        for field, aliases in FIELD_ALIASES.items():
+            for alias in aliases:
+                if item.get(alias):
+                    fields[field] = str(item[alias])
+                    break
+        record = record_from_fields(fields)
+        if record is not None:
+            yield record
+
+
+def write_csv_records(records, f, fmt='csv'):
+    '''Write records to f as CSV in one of EXPORT_FORMATS.'''
+    header, fields = EXPORT_FORMATS[fmt]
+    positions = [RECORD_FIELDS.index(field) if field else None for field in fields]
+    writer = csv.writer(f)
+    writer.writerow(header)
+    for record in records:
+        writer.writerow([record[i] if i is not None else '' for i in positions])
+
+
+def write_json_records(records, f):
+    '''Write records to f as a JSON array of objects, one record at a time.'''
+    f.write('[')
+    for n, record in enumerate(records):
+        f.write(',\n' if n else '\n')
+        f.write(json.dumps(dict(zip(RECORD_FIELDS, record))))
+    f.write('\n]\n')
+
+
+def import_file(vault, path, fmt=None, progress=None):
+    '''Import a CSV or JSON file into the vault in one transaction. Returns the number of records added.'''
+    reader = read_json_records if file_format(path, fmt) == 'json' else read_csv_records
+    # utf-8-sig drops the byte order mark some browsers write
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return vault.import_records(reader(f), progress)
+
+
+def export_file(vault, path, fmt=None, progress=None):
+    '''Export every record to a file ('csv', 'json', 'chrome' or 'firefox'). Returns the number of records written.'''
+    fmt = file_format(path, fmt)
+    count = 0
+
+    def counted(records):
+        nonlocal count
+        for count, record in enumerate(records, 1):
+            if progress and count % EXPORT_CHUNK == 0:
+                progress(count)
+            yield record
+
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        if fmt == 'json':
+            write_json_records(counted(vault.iter_records()), f)
+        else:
+            write_csv_records(counted(vault.iter_records()), f, fmt)
+    return count
+
+
+class Vault:
+    '''A password vault stored in one sqlite database.'''
+
+    def __init__(self, path=DB_FILE):
+        # isolation_level=None: we open transactions ourselves with BEGIN
+        self.conn = sqlite3.connect(path, isolation_level=None, cached_statements=64)
+        for pragma in PRAGMAS:
+            self.conn.execute(pragma)
+        self.migrate()
+        self.has_fts = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'manager_fts'").fetchone() is not None
+        # Set by unlock(); the derived key never leaves this object
+        self.cipher = None
+
+    def migrate(self):
+        '''Bring the database up to SCHEMA_VERSION.'''
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        with self.transaction() as conn:
+            if version < 1:
+                # Version 0: rebuild the table with an explicit primary key, keeping the record ids
+                legacy = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'manager'").fetchone()
+                if legacy:
+                    conn.execute("ALTER TABLE manager RENAME TO manager_legacy")
+                conn.execute(CREATE_TABLE)
+                if legacy:
+                    conn.execute(COPY_LEGACY_TABLE)
+                    conn.execute("DROP TABLE manager_legacy")
+                for statement in CREATE_INDEXES:
+                    conn.execute(statement)
+                try:
+                    conn.execute("SAVEPOINT fts")
+                    for statement in CREATE_FTS:
+                        conn.execute(statement)
+                    conn.execute("RELEASE fts")
+                except sqlite3.OperationalError:
+                    # No FTS5 or trigram tokenizer in this sqlite build; search falls back to scanning
+                    conn.execute("ROLLBACK TO fts")
+                    conn.execute("RELEASE fts")
+            elif version < 2:
+                # Version 1: the FTS update trigger fired on password changes too
+                if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'manager_fts_update'").fetchone():
+                    conn.execute("DROP TRIGGER manager_fts_update")
+                    conn.execute(CREATE_FTS_UPDATE_TRIGGER)
+            conn.execute(CREATE_META)
+            conn.execute("PRAGMA user_version = %d" % SCHEMA_VERSION)
+
+    def get_meta(self, key):
+        row = self.conn.execute(SELECT_META, {'key': key}).fetchone()
+        return row[0] if row else None
+
+    def is_initialized(self):
+        '''Return True if a master password has been set for this vault.'''
+        return self.get_meta('salt') is not None
+
+    def unlock(self, master_password):
+        '''
+        Derive the vault key from the master password and keep it for the session.
+
+        The first unlock sets the master password and encrypts any passwords still stored as
+        plaintext. Raises WrongPassword if the password does not match the one set before.
+        '''
+        salt = self.get_meta('salt')
+        if salt is None:
+            salt = os.urandom(SALT_SIZE)
+            params = '%d:%d:%d' % (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+        else:
+            params = self.get_meta('scrypt')
+        n, r, p = (int(value) for value in params.split(':'))
+        key = hashlib.scrypt(master_password.encode(), salt=salt, n=n, r=r, p=p, maxmem=SCRYPT_MAXMEM, dklen=32)
+        cipher = AESGCM(key)
+
+        verifier = self.get_meta('verifier')
+        if verifier is not None:
+            try:
+                cipher.decrypt(verifier[:NONCE_SIZE], verifier[NONCE_SIZE:], None)
+            except InvalidTag:
+                raise WrongPassword("Wrong master password") from None
+        self.cipher = cipher
+
+        with self.transaction() as conn:
+            if verifier is None:
+                conn.execute(INSERT_META, {'key': 'salt', 'value': salt})
+                conn.execute(INSERT_META, {'key': 'scrypt', 'value': params})
+                conn.execute(INSERT_META, {'key': 'verifier', 'value': self.encrypt(VERIFIER)})
+            if self.get_meta(PLAINTEXT_DONE) is None:
+                self.encrypt_plaintext(conn)
+                conn.execute(INSERT_META, {'key': PLAINTEXT_DONE, 'value': 1})
+
+    def lock(self):
+        '''Forget the session key.'''
+        self.cipher = None
+
+    def encrypt_plaintext(self, conn):
+        '''Encrypt the passwords left over from before the vault was encrypted, IMPORT_CHUNK rows at a time.'''
+        cursor = conn.execute(SELECT_PLAINTEXT)
+        while True:
+            rows = cursor.fetchmany(IMPORT_CHUNK)
+            if not rows:
+                break
+            conn.executemany(ENCRYPT_PASSWORD, [(self.encrypt(password), oid) for oid, password in rows])
+
+    def encrypt(self, value):
+        '''Encrypt a str or bytes value as nonce + AES-GCM ciphertext.'''
+        if self.cipher is None:
+            raise VaultLocked("The vault is locked")
+        if isinstance(value, str):
+            value = value.encode()
+        nonce = os.urandom(NONCE_SIZE)
+        return nonce + self.cipher.encrypt(nonce, value, None)
+
+    def decrypt(self, value):
+        '''Decrypt a password as stored in the manager table.'''
+        if isinstance(value, str):
+            # Not encrypted yet (only until the first unlock)
+            return value
+        if self.cipher is None:
+            raise VaultLocked("The vault is locked")
+        return self.cipher.decrypt(value[:NONCE_SIZE], value[NONCE_SIZE:], None).decode()
+
+    @contextmanager
+    def transaction(self):
+        '''Run the enclosed statements in one transaction, rolling back on error.'''
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.conn
+        except BaseException:
+            # An interrupted statement may already have rolled the transaction back
+            if self.conn.in_transaction:
+                self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def add(self, app_name, url, email_id, password):
+        '''Add a record and return its id.'''
+        with self.transaction() as conn:
+            cursor = conn.execute(INSERT_RECORD, {
+                'app_name': app_name,
+                'url': url,
+                'email_id': email_id,
+                'password': self.encrypt(password)
+            })
+        return cursor.lastrowid
+
+    def all(self):
+        '''Return every record as (id, app_name, url, email_id), without the password.'''
+        return self.conn.execute(SELECT_ALL).fetchall()
+
+    def iter_records(self):
+        '''Yield every record as (app_name, url, email_id, password) in id order, decrypting as it streams from the cursor.'''
+        cursor = self.conn.execute(SELECT_EXPORT)
+        while True:
+            rows = cursor.fetchmany(EXPORT_CHUNK)
+            if not rows:
+                return
+            for app_name, url, email_id, password in rows:
+                yield app_name, url, email_id, self.decrypt(password)
+
+    def import_records(self, records, progress=None, chunk_size=IMPORT_CHUNK):
+        '''
+        Add (app_name, url, email_id, password) records in one transaction, chunk_size rows per executemany().
+        progress(count) is called after each chunk. Returns the number of records added.
+        '''
+        count = 0
+        records = iter(records)
+        with self.transaction() as conn:
+            if self.has_fts:
+                # Feeding the trigram index row by row is ~10x slower than one bulk insert at the end
+                after_id = conn.execute(SELECT_MAX_ID).fetchone()[0]
+                conn.execute(DROP_FTS_INSERT_TRIGGER)
+            while True:
+                chunk = [(app_name, url, email_id, self.encrypt(password))
+                         for app_name, url, email_id, password in itertools.islice(records, chunk_size)]
+                if not chunk:
+                    break
+                conn.executemany(INSERT_RECORDS, chunk)
+                count += len(chunk)
+                if progress:
+                    progress(count)
+            if self.has_fts:
+                conn.execute(INDEX_NEW_RECORDS, {'after_id': after_id})
+                conn.execute(CREATE_FTS_INSERT_TRIGGER)
+        return count
+
+    def page(self, after_id=0, limit=PAGE_SIZE):
+        '''Return up to limit records (id, app_name, url, email_id) with an id greater than after_id, in id order.'''
+        return self.conn.execute(SELECT_PAGE, {'after_id': after_id, 'limit': limit}).fetchall()
+
+    def get(self, oid):
+        '''Return one record as (id, app_name, url, email_id, password) with the password decrypted, or None.'''
+        record = self.conn.execute(SELECT_RECORD, {'oid': oid}).fetchone()
+        if record is None:
+            return None
+        return record[:4] + (self.decrypt(record[4]),)
+
+    def reveal(self, oid):
+        '''Return the decrypted password of one record, or None if there is no such record.'''
+        row = self.conn.execute(SELECT_PASSWORD, {'oid': oid}).fetchone()
+        return self.decrypt(row[0]) if row else None
+
+    def update(self, oid, app_name, url, email_id, password):
+        '''Replace the fields of a record. Returns False if there is no such record.'''
+        with self.transaction() as conn:
+            cursor = conn.execute(UPDATE_RECORD, {
+                'app_name': app_name,
+                'url': url,
+                'email_id': email_id,
+                'password': self.encrypt(password),
+                'oid': oid
+            })
+        return cursor.rowcount > 0
+
+    def delete(self, oid):
+        '''Delete a record. Returns False if there is no such record.'''
+        with self.transaction() as conn:
+            cursor = conn.execute(DELETE_RECORD, {'oid': oid})
+        return cursor.rowcount > 0
+
+    def search(self, text, limit=SEARCH_LIMIT):
+        '''Return up to limit records (id, app_name, url, email_id) whose app name, URL or email contains text (prefix match below 3 characters).'''
+        text = text.strip()
+        if not text:
+            return []
+        if not self.has_fts:
+            return self.conn.execute(SEARCH_SCAN, {'pattern': '%' + escape_like(text) + '%', 'limit': limit}).fetchall()
+        if len(text) < 3:
+            # Each column's index stops after `limit` rows; merge them without duplicates
+            records = {}
+            for statement in SEARCH_PREFIX:
+                for record in self.conn.execute(statement, {'pattern': escape_like(text) + '%', 'limit': limit}):
+                    records.setdefault(record[0], record)
+                if len(records) >= limit:
+                    break
+            return list(records.values())[:limit]
+        query = '"' + text.replace('"', '""') + '"'
+        return self.conn.execute(SEARCH_FTS, {'query': query, 'limit': limit}).fetchall()
+
+    def close(self):
+        self.conn.close()
+
+
+# Marks progress reports in VaultWorker.results
+_PROGRESS = object()
+
+
+class Job:
+    '''A call queued on a VaultWorker.'''
+
+    def __init__(self, func, args, callback, on_error, progress, cancellable=True):
+        self.func = func
+        self.args = args
+        self.callback = callback
+        self.on_error = on_error
+        self.progress = progress
+        self.cancellable = cancellable
+        self.cancelled = False
+        self.done = False
+
+
+class VaultWorker:
+    '''
+    Run vault calls on a background thread that owns the sqlite connection.
+
+    Calls are queued with submit() and run one at a time. Their results are handed back by
+    poll(), which the GUI calls from its own thread (e.g. with root.after), so callbacks never
+    run on the worker thread.
+    '''
+
+    def __init__(self, path=DB_FILE):
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.jobs = set()
+        self.current = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._error = None
+        self.thread = threading.Thread(target=self._run, args=(path,), name="vault-worker", daemon=True)
+        self.thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+
+    def _run(self, path):
+        # The connection is opened here so it is only ever used by this thread
+        try:
+            self.vault = Vault(path)
+        except Exception as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+
+        while True:
+            job = self.requests.get()
+            if job is None:
+                break
+            with self._lock:
+                if job.cancelled:
+                    job.done = True
+                    self.results.put((job, None, None))
+                    continue
+                self.current = job
+            try:
+                if job.progress is None:
+                    result, error = job.func(*job.args), None
+                else:
+                    result, error = job.func(*job.args, progress=self._reporter(job)), None
+            except Exception as e:
+                result, error = None, e
+            with self._lock:
+                self.current = None
+                job.done = True
+            self.results.put((job, result, error))
+        self.vault.close()
+
+    def _reporter(self, job):
+        # Passed to long jobs as progress=; also where a cancelled long job stops
+        def report(count):
+            if job.cancelled:
+                raise Cancelled()
+            self.results.put((job, count, _PROGRESS))
+        return report
+
+    def submit(self, func, *args, callback=None, on_error=None, progress=None, cancellable=True):
+        '''
+        Queue func(*args) (usually a method of self.vault) and return its Job.
+        If progress is given, func is also passed a progress= function and its reports are delivered to progress.
+        A job submitted with cancellable=False is left alone by cancel_all().
+        '''
+        job = Job(func, args, callback, on_error, progress, cancellable)
+        self.jobs.add(job)
+        self.requests.put(job)
+        return job
+
+    def cancel(self, job):
+        '''
+        Cancel a job: skip it if it is still queued, interrupt its query if it is running, and drop its
+        callback if it has finished but poll() has not delivered it yet.
+        '''
+        with self._lock:
+            job.cancelled = True
+            if self.current is job and not job.done:
+                self.vault.conn.interrupt()
+
+    def cancel_all(self):
+        '''Cancel every cancellable job that has not been delivered by poll() yet.'''
+        for job in list(self.jobs):
+            if job.cancellable:
+                self.cancel(job)
+
+    def poll(self):
+        '''Run the callbacks of finished jobs; call this from the GUI thread. Returns True while jobs are pending.'''
+        while True:
+            try:
+                job, result, error = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if error is _PROGRESS:
+                if not job.cancelled:
+                    job.progress(result)
+                continue
+            self.jobs.discard(job)
+            if job.cancelled:
+                continue
+            if error is not None:
+                if job.on_error is None:
+                    raise error
+                job.on_error(error)
+            elif job.callback is not None:
+                job.callback(result)
+        return bool(self.jobs)
+
+    def close(self):
+        '''Finish the queued jobs and close the connection.'''
+        self.requests.put(None)
+        self.thread.join()
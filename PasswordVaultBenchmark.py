@@ -0,0 +1,124 @@
+'''
+CRUD benchmark for the password vault.
+
+Builds throwaway vaults of each size and times the operations the Password
+Manager performs, one call at a time, e.g.
+
+    python PasswordVaultBenchmark.py --sizes 1000 100000 1000000 --ops 1000
+
+For every size it reports the throughput of insert, update, delete, get, search
+and list (one page), with p50/p95/p99 latencies, so storage changes can be
+compared run against run.
+'''
+
+import argparse
+import json
+import math
+import os
+import random
+import tempfile
+import time
+
+from PasswordVault import Vault
+
+MASTER_PASSWORD = "benchmark"
+# Words the generated app names are built from, so searches have realistic hit rates
+WORDS = ("mail", "bank", "shop", "cloud", "news", "game", "music", "photo", "travel", "work",
+         "chat", "video", "school", "health", "home", "code", "forum", "market", "drive", "store")
+
+
+def generate_records(count, rng):
+    '''Yield count (app_name, url, email_id, password) records.'''
+    for i in range(count):
+        name = "%s%s%d" % (rng.choice(WORDS), rng.choice(WORDS), i)
+        yield (name, "https://www.%s.example.com/login" % name, "user%d@example.com" % i,
+               "%016x" % rng.getrandbits(64))
+
+
+def percentile(latencies, p):
+    '''Return the p-th percentile (nearest rank) of a sorted list.'''
+    return latencies[max(0, math.ceil(p / 100 * len(latencies)) - 1)]
+
+
+def time_calls(operation, calls):
+    '''Run operation(*args) for each args tuple in calls and return the result summary.'''
+    latencies = []
+    start = time.perf_counter()
+    for args in calls:
+        t = time.perf_counter()
+        operation(*args)
+        latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'ops': len(latencies),
+        'ops_per_sec': len(latencies) / elapsed if elapsed else float('inf'),
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+
+def benchmark_size(size, ops, rng, directory):
+    '''Fill a new vault with size records and time ops calls of each operation against it.'''
+    path = os.path.join(directory, "vault-%d.db" % size)
+    vault = Vault(path)
+    try:
+        vault.unlock(MASTER_PASSWORD)
+        start = time.perf_counter()
+        vault.import_records(generate_records(size, rng))
+        results = {'size': size, 'load_sec': time.perf_counter() - start, 'operations': {}}
+        operations = results['operations']
+
+        ids = [row[0] for row in vault.conn.execute("SELECT id FROM manager")]
+        new_records = list(generate_records(ops, rng))
+        operations['insert'] = time_calls(vault.add, new_records)
+        operations['get'] = time_calls(vault.get, [(rng.choice(ids),) for _ in range(ops)])
+        operations['update'] = time_calls(vault.update, [(oid,) + record for oid, record in
+                                                         zip(rng.sample(ids, min(ops, len(ids))), new_records)])
+        # Search by a substring from the middle of a name (trigram index) and by a short prefix
+        operations['search'] = time_calls(vault.search, [(rng.choice(WORDS) + rng.choice(WORDS),)
+                                                         for _ in range(ops)])
+        operations['search_prefix'] = time_calls(vault.search, [(rng.choice(WORDS)[:2],) for _ in range(ops)])
+        operations['list_page'] = time_calls(vault.page, [(rng.choice(ids),) for _ in range(ops)])
+        operations['delete'] = time_calls(vault.delete, [(oid,) for oid in rng.sample(ids, min(ops, len(ids)))])
+        return results
+    finally:
+        vault.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the password vault's CRUD operations.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000],
+                        help="Vault sizes to benchmark (default: %(default)s)")
+    parser.add_argument('--ops', type=int, default=1000, help="Calls timed per operation (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=1, help="Random seed (default: %(default)s)")
+    parser.add_argument('--dir', help="Where to create the vaults (default: a temporary directory)")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        results = [benchmark_size(size, args.ops, rng, directory) for size in args.sizes]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for result in results:
+        print("\n%d records (loaded in %.2f s)" % (result['size'], result['load_sec']))
+        print("%-16s%12s%12s%12s%12s" % ("Operation", "Ops/sec", "p50 ms", "p95 ms", "p99 ms"))
+        print('-' * 64)
+        for name, stats in result['operations'].items():
+            print("%-16s%12.0f%12.3f%12.3f%12.3f" % (name, stats['ops_per_sec'], stats['p50_ms'],
+                                                     stats['p95_ms'], stats['p99_ms']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+'''
+Record server for the Hospital Management System.
+
+Lets several reception desks share one patient store. The server owns the
+database; clients connect over TCP (host:port) or a Unix socket (a path) and
+send one JSON request per line:
+
+    {"id": 1, "op": "get", "args": {"patient_no": 42}}
+
+and get one JSON response per line:
+
+    {"id": 1, "ok": true, "result": {...}}   or   {"id": 1, "ok": false, "error": "..."}
+
+sqlite allows one writer at a time, so writes are committed by a single writer
+thread. Each write first takes a lock on the record (or room queue) it changes,
+so writes to the same record run one after another in the order they arrived.
+Reads run on a pool of reader threads, each with its own connection; in WAL
+mode those read the last committed state and never wait for a write.
+
+RecordClient is a blocking client with the same methods as PatientStore, so
+HospitalManagementSystem.py can use either.
+
+    python PatientServer.py --listen 127.0.0.1:8765
+    python HospitalManagementSystem.py --server 127.0.0.1:8765
+'''
+
+import argparse
+import asyncio
+import functools
+import itertools
+import json
+import logging
+import socket
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from PatientStore import PatientStore, StoreMaintenance, DB_FILE, PAGE_SIZE, SEARCH_LIMIT, page_position
+from PatientStore import CHECKPOINT_INTERVAL, SNAPSHOT_INTERVAL
+
+DEFAULT_ADDRESS = "127.0.0.1:8765"
+READER_THREADS = 4
+# Longest request line accepted, in bytes
+MAX_REQUEST_SIZE = 1 << 20
+
+# op -> (store method, argument names); reads run on the reader threads
+READ_OPS = {
+    'get': ('get', ('patient_no',)),
+    'exists': ('exists', ('patient_no',)),
+    'count': ('count', ()),
+    'page': ('page', ('after_no', 'limit', 'sort', 'after_key')),
+    'search_name': ('search_name', ('prefix', 'limit')),
+    'search_room': ('search_room', ('room', 'limit')),
+    'search_disease': ('search_disease', ('text', 'limit')),
+    'queue': ('queued', ('room',)),
+    'queue_size': ('queued_count', ('room',)),
+}
+# op -> (store or triage method, argument names, argument that names the locked record or room)
+WRITE_OPS = {
+    'add': ('add', ('name', 'address', 'age', 'sex', 'disease', 'specialist_room', 'priority'), None),
+    'edit': ('edit', ('patient_no', 'choice', 'value'), 'patient_no'),
+    'delete': ('delete', ('patient_no',), 'patient_no'),
+    'delete_all': ('delete_all', (), None),
+    'enqueue': ('triage.enqueue', ('patient_no', 'room', 'priority'), 'patient_no'),
+    'next_patient': ('triage.next_patient', ('room',), 'room'),
+    'reprioritize': ('triage.reprioritize', ('patient_no', 'priority'), 'patient_no'),
+}
+
+
+class RecordServerError(Exception):
+    '''An error reported by the record server.'''
+
+
+def parse_address(address):
+    '''Return ('unix', path) for a socket path or ('tcp', (host, port)) for host:port.'''
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit():
+        return 'tcp', (host or '127.0.0.1', int(port))
+    return 'unix', address
+
+
+def resolve(target, name):
+    for part in name.split('.'):
+        target = getattr(target, part)
+    return target
+
+
+class RecordServer:
+    '''Serves one patient database to many clients.'''
+
+    def __init__(self, path=DB_FILE, readers=READER_THREADS):
+        self.path = path
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='writer')
+        self.readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='reader',
+                                          initializer=self._open_reader)
+        self.local = threading.local()
+        # The writer's store, with the triage queues in memory, lives on the writer thread
+        self.store = self.writer.submit(PatientStore, path).result()
+        # Locks for records and room queues being written; they go away when nobody holds or waits on them
+        self.locks = weakref.WeakValueDictionary()
+
+    def _open_reader(self):
+        self.local.store = PatientStore(self.path, load_triage=False)
+
+    def _read(self, method, args):
+        return getattr(self.local.store, method)(**args)
+
+    def lock(self, key):
+        lock = self.locks.get(key)
+        if lock is None:
+            lock = self.locks[key] = asyncio.Lock()
+        return lock
+
+    async def execute(self, op, args):
+        '''Run one request and return its result.'''
+        loop = asyncio.get_running_loop()
+        if op in READ_OPS:
+            method, names = READ_OPS[op]
+            return await loop.run_in_executor(self.readers, self._read, method,
+                                              {n: args[n] for n in names if n in args})
+        if op not in WRITE_OPS:
+            raise RecordServerError("Unknown operation: %s" % op)
+        method, names, key = WRITE_OPS[op]
+        function = resolve(self.store, method)
+        call = functools.partial(function, **{n: args[n] for n in names if n in args})
+        if key is None:
+            return await loop.run_in_executor(self.writer, call)
+        async with self.lock((key, args.get(key))):
+            return await loop.run_in_executor(self.writer, call)
+
+    async def handle_client(self, reader, writer):
+        peer = writer.get_extra_info('peername') or 'local client'
+        logging.info("Client connected: %s", peer)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    break
+                if not line:
+                    break
+                response = await self.respond(line)
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            logging.info("Client disconnected: %s", peer)
+            writer.close()
+
+    async def respond(self, line):
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            result = await self.execute(request['op'], request.get('args') or {})
+            return {'id': request_id, 'ok': True, 'result': result}
+        except Exception as e:
+            return {'id': request_id, 'ok': False, 'error': "%s: %s" % (type(e).__name__, e)}
+
+    async def serve(self, address=DEFAULT_ADDRESS):
+        kind, where = parse_address(address)
+        if kind == 'tcp':
+            server = await asyncio.start_server(self.handle_client, *where, limit=MAX_REQUEST_SIZE)
+        else:
+            server = await asyncio.start_unix_server(self.handle_client, where, limit=MAX_REQUEST_SIZE)
+        logging.info("Serving %s on %s", self.path, address)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.readers.shutdown()
+        self.writer.submit(self.store.close).result()
+        self.writer.shutdown()
+
+
+class _TriageClient:
+    '''The triage part of RecordClient, mirroring PatientStore.triage.'''
+
+    def __init__(self, client):
+        self.client = client
+
+    def enqueue(self, patient_no, room, priority):
+        return self.client.call('enqueue', patient_no=patient_no, room=room, priority=priority)
+
+    def next_patient(self, room):
+        return self.client.call('next_patient', room=room)
+
+    def reprioritize(self, patient_no, priority):
+        return self.client.call('reprioritize', patient_no=patient_no, priority=priority)
+
+    def queue(self, room):
+        return [tuple(entry) for entry in self.client.call('queue', room=room)]
+
+    def size(self, room):
+        return self.client.call('queue_size', room=room)
+
+
+class RecordClient:
+    '''A blocking connection to a RecordServer, with the same methods as PatientStore.'''
+
+    def __init__(self, address=DEFAULT_ADDRESS):
+        kind, where = parse_address(address)
+        if kind == 'tcp':
+            self.sock = socket.create_connection(where)
+        else:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(where)
+        self.file = self.sock.makefile('rwb')
+        self.ids = itertools.count(1)
+        self.triage = _TriageClient(self)
+
+    def call(self, op, **args):
+        '''Send one request and return its result, raising RecordServerError if it failed.'''
+        request_id = next(self.ids)
+        self.file.write(json.dumps({'id': request_id, 'op': op, 'args': args}).encode() + b'\n')
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise RecordServerError("Connection closed by the record server")
+        response = json.loads(line)
+        if not response['ok']:
+            raise RecordServerError(response['error'])
+        return response['result']
+
+    def add(self, name, address, age, sex, disease, specialist_room, priority=None):
+        return self.call('add', name=name, address=address, age=age, sex=sex, disease=disease,
+                         specialist_room=specialist_room, priority=priority)
+
+    def get(self, patient_no):
+        return self.call('get', patient_no=patient_no)
+
+    def exists(self, patient_no):
+        return self.call('exists', patient_no=patient_no)
+
+    def edit(self, patient_no, choice, value):
+        return self.call('edit', patient_no=patient_no, choice=choice, value=value)
+
+    def delete(self, patient_no):
+        return self.call('delete', patient_no=patient_no)
+
+    def delete_all(self):
+        return self.call('delete_all')
+
+    def count(self):
+        return self.call('count')
+
+    def page(self, after_no=0, limit=PAGE_SIZE, sort='patient_no', after_key=None):
+        return self.call('page', after_no=after_no, limit=limit, sort=sort, after_key=after_key)
+
+    def iter_all(self, sort='patient_no'):
+        '''Yield every record in sort order, one page per request.'''
+        after_no, after_key = 0, None
+        while True:
+            records = self.page(after_no, 500, sort, after_key)
+            if not records:
+                return
+            yield from records
+            after_no, after_key = page_position(records[-1], sort)
+
+    def search_name(self, prefix, limit=SEARCH_LIMIT):
+        return self.call('search_name', prefix=prefix, limit=limit)
+
+    def search_room(self, room, limit=SEARCH_LIMIT):
+        return self.call('search_room', room=room, limit=limit)
+
+    def search_disease(self, text, limit=SEARCH_LIMIT):
+        return self.call('search_disease', text=text, limit=limit)
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the patient records to Hospital Management System clients.")
+    parser.add_argument('--db', default=DB_FILE, help="Patient database (default: %(default)s)")
+    parser.add_argument('--listen', default=DEFAULT_ADDRESS,
+                        help="host:port or a Unix socket path to listen on (default: %(default)s)")
+    parser.add_argument('--readers', type=int, default=READER_THREADS,
+                        help="Reader threads (default: %(default)s)")
+    parser.add_argument('--checkpoint-interval', type=float, default=CHECKPOINT_INTERVAL,
+                        help="Seconds between log checkpoints (default: %(default)s)")
+    parser.add_argument('--snapshot-interval', type=float, default=SNAPSHOT_INTERVAL,
+                        help="Seconds between database snapshots, 0 to disable (default: %(default)s)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    async def run():
+        server = RecordServer(args.db, args.readers)
+        maintenance = StoreMaintenance(args.db, args.checkpoint_interval, args.snapshot_interval).start()
+        try:
+            await server.serve(args.listen)
+        finally:
+            maintenance.stop()
+            server.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,762 @@
+'''
+Patient record storage for the Hospital Management System.
+
+Patients are kept in one sqlite table keyed by patient number, so looking a
+patient up is a single B-tree search however many records there are. Patient
+numbers come from AUTOINCREMENT: they only ever go up and are never reused,
+even after a delete. Secondary indexes on the name and specialist room, and an
+FTS5 index over the disease descriptions, serve the other searches; sqlite
+keeps them up to date on every write.
+
+Patients waiting to see a specialist are held in per-room triage queues
+(TriageQueues), persisted in the triage table so they survive a restart.
+
+The records used to be Python assignments (patient1 = {...}) in
+PatientRecords.py; migrate_patient_records() moves them into the store.
+import_csv() and export_csv() load and save records in bulk as CSV.
+
+Durability: every change is a transaction appended to the write-ahead log
+(patients.db-wal) and fsync'd before the commit returns, so an edit costs the
+same however many patients there are, and a crash loses at most the change in
+progress. On the next open sqlite replays the committed part of the log, which
+StoreMaintenance keeps short by checkpointing it into the database in the
+background; it also compacts free pages and writes periodic snapshots.
+'''
+
+import ast
+import csv
+import heapq
+import itertools
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DB_FILE = "patients.db"
+LEGACY_FILE = "PatientRecords.py"
+
+PRAGMAS = (
+    # Only takes effect on a new database; lets StoreMaintenance hand free pages back to the file system
+    "PRAGMA auto_vacuum = INCREMENTAL",
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = FULL",        # fsync the log on every commit
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA journal_size_limit = 4194304",  # Truncate the log back to 4 MB after a checkpoint
+)
+
+# Background maintenance: how often the log is checkpointed and a snapshot taken, in seconds
+CHECKPOINT_INTERVAL = 30
+SNAPSHOT_INTERVAL = 15 * 60
+SNAPSHOT_SUFFIX = ".snapshot"
+# Free pages released per maintenance pass, once at least VACUUM_THRESHOLD pages are free
+VACUUM_PAGES = 1000
+VACUUM_THRESHOLD = 100
+
+# Schema versions, tracked in PRAGMA user_version:
+#   1 - the patients table
+#   2 - name and specialist room indexes, FTS5 index over the disease descriptions
+#   3 - triage table for the specialist waiting queues
+#   4 - age index, for listing by age
+SCHEMA_VERSION = 4
+
+# Triage priorities; lower is seen first
+EMERGENCY = 0
+OPD = 1
+PRIORITY_NAMES = {EMERGENCY: 'Emergency', OPD: 'O.P.D'}
+
+# Record fields as they are shown to the user, and the column each one is stored in
+FIELDS = (
+    ('Patient no.', 'patient_no'),
+    ('Name', 'name'),
+    ('Address', 'address'),
+    ('Age', 'age'),
+    ('Sex', 'sex'),
+    ('Disease Description', 'disease'),
+    ('Referred Specialist room no.', 'specialist_room'),
+)
+# The edit menu's choices 1-6, in menu order
+EDIT_COLUMNS = ('name', 'address', 'age', 'sex', 'disease', 'specialist_room')
+
+CREATE_TABLE = """CREATE TABLE IF NOT EXISTS patients (
+                      patient_no INTEGER PRIMARY KEY AUTOINCREMENT,
+                      name TEXT NOT NULL,
+                      address TEXT,
+                      age INTEGER,
+                      sex TEXT,
+                      disease TEXT,
+                      specialist_room INTEGER
+                  )"""
+CREATE_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS patients_name ON patients (name COLLATE NOCASE)",
+    # Ends in patient_no (the rowid) anyway; a room's patients come out in patient number order
+    "CREATE INDEX IF NOT EXISTS patients_room ON patients (specialist_room)",
+    "CREATE INDEX IF NOT EXISTS patients_age ON patients (age)",
+)
+# Inverted index over the disease descriptions; it stores only the index, not a copy of the text.
+# The porter stemmer lets "fevers" find "fever" and "sprain" find "sprained".
+CREATE_FTS = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS patients_fts USING fts5(
+           disease, content='patients', content_rowid='patient_no', tokenize='porter unicode61')""",
+    """CREATE TRIGGER IF NOT EXISTS patients_fts_insert AFTER INSERT ON patients BEGIN
+           INSERT INTO patients_fts (rowid, disease) VALUES (new.patient_no, new.disease);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS patients_fts_delete AFTER DELETE ON patients BEGIN
+           INSERT INTO patients_fts (patients_fts, rowid, disease) VALUES ('delete', old.patient_no, old.disease);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS patients_fts_update AFTER UPDATE OF disease ON patients BEGIN
+           INSERT INTO patients_fts (patients_fts, rowid, disease) VALUES ('delete', old.patient_no, old.disease);
+           INSERT INTO patients_fts (rowid, disease) VALUES (new.patient_no, new.disease);
+       END""",
+    "INSERT INTO patients_fts (patients_fts) VALUES ('rebuild')",
+)
+DROP_FTS_INSERT_TRIGGER = "DROP TRIGGER patients_fts_insert"
+# Index a bulk import in one statement: every imported row is numbered after the last number issued before it
+INDEX_IMPORTED = """INSERT INTO patients_fts (rowid, disease)
+                    SELECT patient_no, disease FROM patients WHERE patient_no > :after_no"""
+# seq is the arrival order, kept when a patient is reprioritized or moved to another room
+CREATE_TRIAGE = (
+    """CREATE TABLE IF NOT EXISTS triage (
+           patient_no INTEGER PRIMARY KEY,
+           room INTEGER NOT NULL,
+           priority INTEGER NOT NULL,
+           seq INTEGER NOT NULL
+       )""",
+    # A deleted patient leaves the queue; a re-referred one moves to the new room's queue
+    """CREATE TRIGGER IF NOT EXISTS triage_patient_delete AFTER DELETE ON patients BEGIN
+           DELETE FROM triage WHERE patient_no = old.patient_no;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS triage_patient_room AFTER UPDATE OF specialist_room ON patients BEGIN
+           UPDATE triage SET room = new.specialist_room WHERE patient_no = new.patient_no;
+       END""",
+)
+SELECT_TRIAGE = "SELECT patient_no, room, priority, seq FROM triage"
+# Queue contents read straight from the table, for connections that do not hold the queues in memory
+SELECT_ROOM_QUEUE = "SELECT patient_no, priority FROM triage WHERE room = :room ORDER BY priority, seq"
+COUNT_ROOM_QUEUE = "SELECT count(*) FROM triage WHERE room = :room"
+INSERT_TRIAGE = """INSERT OR REPLACE INTO triage (patient_no, room, priority, seq)
+                   VALUES (:patient_no, :room, :priority, :seq)"""
+UPDATE_TRIAGE_PRIORITY = "UPDATE triage SET priority = :priority WHERE patient_no = :patient_no"
+DELETE_TRIAGE = "DELETE FROM triage WHERE patient_no = :patient_no"
+COLUMNS = ', '.join(column for _, column in FIELDS)
+INSERT_PATIENT = """INSERT INTO patients (name, address, age, sex, disease, specialist_room)
+                    VALUES (:name, :address, :age, :sex, :disease, :specialist_room)"""
+# Migrated records keep their patient number; AUTOINCREMENT carries on after the highest one.
+# A plain INSERT: REPLACE's implicit delete would not fire the FTS and triage delete triggers.
+INSERT_NUMBERED_PATIENT = """INSERT INTO patients (%s)
+                             VALUES (:patient_no, :name, :address, :age, :sex, :disease, :specialist_room)""" % COLUMNS
+SELECT_PATIENT = "SELECT %s FROM patients WHERE patient_no = :patient_no" % COLUMNS
+SELECT_ALL = "SELECT %s FROM patients ORDER BY patient_no" % COLUMNS
+SELECT_PAGE = "SELECT %s FROM patients WHERE patient_no > :after_no ORDER BY patient_no LIMIT :limit" % COLUMNS
+PAGE_SIZE = 20
+# Listing orders: sort name -> (column expression, field it is read from). Every order ends in patient_no,
+# so a page can start right after the (key, patient_no) of the last record shown, using the column's index.
+SORT_ORDERS = {
+    'patient_no': ('patient_no', 'Patient no.'),
+    'name': ('name COLLATE NOCASE', 'Name'),
+    'age': ('age', 'Age'),
+    'room': ('specialist_room', 'Referred Specialist room no.'),
+}
+SELECT_SORTED = "SELECT %s FROM patients ORDER BY {0}, patient_no" % COLUMNS
+SELECT_SORTED_FIRST_PAGE = "SELECT %s FROM patients ORDER BY {0}, patient_no LIMIT :limit" % COLUMNS
+# A page after (key, patient_no) is the rest of that key's records, then the records with greater keys.
+# As two queries each is a single index seek; as one OR'd query sqlite scans every record with the key,
+# which is most of the table for a room. NULLs sort first, hence the IS forms.
+SELECT_SAME_KEY = """SELECT %s FROM patients WHERE {0} = :after_key AND patient_no > :after_no
+                      ORDER BY patient_no LIMIT :limit""" % COLUMNS
+SELECT_GREATER_KEY = "SELECT %s FROM patients WHERE {0} > :after_key ORDER BY {0}, patient_no LIMIT :limit" % COLUMNS
+SELECT_NULL_KEY = """SELECT %s FROM patients WHERE {0} IS NULL AND patient_no > :after_no
+                     ORDER BY patient_no LIMIT :limit""" % COLUMNS
+SELECT_NOT_NULL_KEY = "SELECT %s FROM patients WHERE {0} IS NOT NULL ORDER BY {0}, patient_no LIMIT :limit" % COLUMNS
+UPDATE_FIELD = "UPDATE patients SET %s = :value WHERE patient_no = :patient_no"
+DELETE_PATIENT = "DELETE FROM patients WHERE patient_no = :patient_no"
+DELETE_ALL = "DELETE FROM patients"
+COUNT_PATIENTS = "SELECT count(*) FROM patients"
+# The highest patient number AUTOINCREMENT has ever issued, deleted or not
+SELECT_LAST_ISSUED_NO = "SELECT ifnull((SELECT seq FROM sqlite_sequence WHERE name = 'patients'), 0)"
+
+# CSV import: rows validated and committed per transaction
+IMPORT_BATCH = 5000
+# Accepted header names for each column (compared ignoring case); exports use the column names
+CSV_ALIASES = {column: (column, label.lower()) for label, column in FIELDS}
+CSV_REQUIRED = ('name', 'age', 'sex', 'specialist_room')
+MAX_AGE = 150
+
+# Name prefix search: a range scan of the NOCASE name index
+SEARCH_NAME = """SELECT %s FROM patients
+                 WHERE name COLLATE NOCASE >= :low AND name COLLATE NOCASE < :high
+                 ORDER BY name COLLATE NOCASE LIMIT :limit""" % COLUMNS
+SEARCH_ROOM = "SELECT %s FROM patients WHERE specialist_room = :room LIMIT :limit" % COLUMNS
+SEARCH_DISEASE = """SELECT %s FROM patients_fts JOIN patients p ON p.patient_no = patients_fts.rowid
+                    WHERE patients_fts MATCH :query LIMIT :limit""" % ', '.join('p.' + column for _, column in FIELDS)
+# Used when the sqlite build has no FTS5
+SEARCH_DISEASE_SCAN = "SELECT %s FROM patients WHERE disease LIKE :pattern ESCAPE '\\' LIMIT :limit" % COLUMNS
+SEARCH_LIMIT = 100
+# Sorts after any name character, to close the prefix range
+PREFIX_END = '\U0010ffff'
+FETCH_SIZE = 500
+
+LEGACY_NAME = re.compile(r'patient(\d+)$')
+WORD = re.compile(r'\w+')
+# Names as the add menu accepts them: letters only
+NAME = re.compile(r'[a-zA-Z]+')
+
+
+def to_record(row):
+    '''Turn a patients row into a record dictionary keyed by the displayed field names.'''
+    return {label: value for (label, _), value in zip(FIELDS, row)}
+
+
+def sort_column(sort):
+    if sort not in SORT_ORDERS:
+        raise ValueError("Cannot sort by: %r" % sort)
+    return SORT_ORDERS[sort][0]
+
+
+def page_position(record, sort='patient_no'):
+    '''Return the (after_no, after_key) that starts the page following record in a listing sorted by sort.'''
+    return record['Patient no.'], record[SORT_ORDERS[sort][1]]
+
+
+def check_patient(fields):
+    '''
+    Return the INSERT parameters for one CSV row's {column: text}, or raise ValueError saying what is wrong.
+    The add menu's rules: a name of letters only, a whole-number age, sex m or f and a room number;
+    in addition the age must be 0-MAX_AGE, and sex may be given in either case.
+    '''
+    for column in CSV_REQUIRED:
+        if not fields.get(column, '').strip():
+            raise ValueError("no %s" % column)
+    try:
+        age = int(fields['age'])
+        room = int(fields['specialist_room'])
+        number = int(fields['patient_no']) if fields.get('patient_no', '').strip() else None
+    except ValueError as e:
+        raise ValueError("not a whole number: %s" % str(e).rpartition(': ')[2])
+    if not NAME.fullmatch(fields['name'].strip()):
+        raise ValueError("name must be letters only: %r" % fields['name'])
+    if not 0 <= age <= MAX_AGE:
+        raise ValueError("age out of range: %d" % age)
+    sex = fields['sex'].strip().lower()
+    if sex not in ('m', 'f'):
+        raise ValueError("sex must be m or f: %r" % fields['sex'])
+    if number is not None and number < 1:
+        raise ValueError("patient no. must be 1 or more: %d" % number)
+    return {
+        'patient_no': number,
+        'name': fields['name'].strip(),
+        'address': fields.get('address', '').strip(),
+        'age': age,
+        'sex': sex,
+        'disease': fields.get('disease', '').strip(),
+        'specialist_room': room
+    }
+
+
+class PatientStore:
+    '''Patient records in a sqlite database.'''
+
+    def __init__(self, path=DB_FILE, load_triage=True):
+        # load_triage=False opens a store for reading only, e.g. for the record server's reader threads
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        for pragma in PRAGMAS:
+            self.conn.execute(pragma)
+        self.migrate()
+        self.has_fts = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'patients_fts'").fetchone() is not None
+        self.triage = TriageQueues(self) if load_triage else None
+
+    def migrate(self):
+        '''Bring the database up to SCHEMA_VERSION.'''
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        with self.transaction() as conn:
+            conn.execute(CREATE_TABLE)
+            for statement in CREATE_INDEXES:
+                conn.execute(statement)
+            try:
+                conn.execute("SAVEPOINT fts")
+                for statement in CREATE_FTS:
+                    conn.execute(statement)
+                conn.execute("RELEASE fts")
+            except sqlite3.OperationalError:
+                # No FTS5 in this sqlite build; disease search falls back to scanning
+                conn.execute("ROLLBACK TO fts")
+                conn.execute("RELEASE fts")
+            for statement in CREATE_TRIAGE:
+                conn.execute(statement)
+            conn.execute("PRAGMA user_version = %d" % SCHEMA_VERSION)
+
+    @contextmanager
+    def transaction(self):
+        '''Run the enclosed statements in one transaction, rolling back on error.'''
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.conn
+        except BaseException:
+            if self.conn.in_transaction:
+                self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def add(self, name, address, age, sex, disease, specialist_room, priority=None):
+        '''
+        Add a patient and return the new patient number. If a priority is given the patient is also put in
+        their specialist room's queue, in the same transaction.
+        '''
+        with self.transaction() as conn:
+            cursor = conn.execute(INSERT_PATIENT, {
+                'name': name,
+                'address': address,
+                'age': age,
+                'sex': sex,
+                'disease': disease,
+                'specialist_room': specialist_room
+            })
+            if priority is not None:
+                seq = self.triage.record(conn, cursor.lastrowid, specialist_room, priority)
+        if priority is not None:
+            self.triage.enqueued(cursor.lastrowid, specialist_room, priority, seq)
+        return cursor.lastrowid
+
+    def get(self, patient_no):
+        '''Return a patient's record dictionary, or None.'''
+        row = self.conn.execute(SELECT_PATIENT, {'patient_no': patient_no}).fetchone()
+        return to_record(row) if row else None
+
+    def exists(self, patient_no):
+        return self.get(patient_no) is not None
+
+    def edit(self, patient_no, choice, value):
+        '''Change field `choice` (1-6, as numbered in the edit menu) of a patient. Returns False if there is no such patient.'''
+        if not 1 <= choice <= len(EDIT_COLUMNS):
+            raise ValueError("No such field: %r" % choice)
+        column = EDIT_COLUMNS[choice - 1]
+        with self.transaction() as conn:
+            cursor = conn.execute(UPDATE_FIELD % column, {'value': value, 'patient_no': patient_no})
+        if column == 'specialist_room' and cursor.rowcount:
+            # The trigger has moved the queue row; move the queue entry to match
+            self.triage.moved(patient_no, value)
+        return cursor.rowcount > 0
+
+    def delete(self, patient_no):
+        '''Delete a patient. Returns False if there is no such patient.'''
+        with self.transaction() as conn:
+            cursor = conn.execute(DELETE_PATIENT, {'patient_no': patient_no})
+        self.triage.forget(patient_no)
+        return cursor.rowcount > 0
+
+    def delete_all(self):
+        '''Delete every patient (patient numbers are still not reused).'''
+        with self.transaction() as conn:
+            conn.execute(DELETE_ALL)
+        self.triage.clear()
+
+    def count(self):
+        return self.conn.execute(COUNT_PATIENTS).fetchone()[0]
+
+    def search_name(self, prefix, limit=SEARCH_LIMIT):
+        '''Return up to limit records whose name starts with prefix (ignoring case), in name order.'''
+        prefix = prefix.strip()
+        if not prefix:
+            return []
+        rows = self.conn.execute(SEARCH_NAME, {'low': prefix, 'high': prefix + PREFIX_END, 'limit': limit})
+        return [to_record(row) for row in rows]
+
+    def search_room(self, room, limit=SEARCH_LIMIT):
+        '''Return up to limit records referred to a specialist room, in patient number order.'''
+        return [to_record(row) for row in self.conn.execute(SEARCH_ROOM, {'room': room, 'limit': limit})]
+
+    def search_disease(self, text, limit=SEARCH_LIMIT):
+        '''Return up to limit records whose disease description contains every word in text.'''
+        words = WORD.findall(text)
+        if not words:
+            return []
+        if not self.has_fts:
+            pattern = '%' + text.strip().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            return [to_record(row) for row in self.conn.execute(SEARCH_DISEASE_SCAN, {'pattern': pattern, 'limit': limit})]
+        # Whole words only: a prefix query merges the posting lists of every matching term and is ~20x slower
+        query = ' '.join('"%s"' % word for word in words)
+        return [to_record(row) for row in self.conn.execute(SEARCH_DISEASE, {'query': query, 'limit': limit})]
+
+    def page(self, after_no=0, limit=PAGE_SIZE, sort='patient_no', after_key=None):
+        '''
+        Return up to limit records in sort order (one of SORT_ORDERS), starting after the record numbered
+        after_no whose sort key is after_key (see page_position); after_no 0 starts from the beginning.
+        '''
+        column = sort_column(sort)
+        params = {'after_no': after_no, 'after_key': after_key, 'limit': limit}
+        if sort == 'patient_no':
+            rows = self.conn.execute(SELECT_PAGE, params).fetchall()
+        elif not after_no:
+            rows = self.conn.execute(SELECT_SORTED_FIRST_PAGE.format(column), params).fetchall()
+        else:
+            if after_key is None:
+                same, greater = SELECT_NULL_KEY, SELECT_NOT_NULL_KEY
+            else:
+                same, greater = SELECT_SAME_KEY, SELECT_GREATER_KEY
+            rows = self.conn.execute(same.format(column), params).fetchall()
+            if len(rows) < limit:
+                params['limit'] = limit - len(rows)
+                rows += self.conn.execute(greater.format(column), params).fetchall()
+        return [to_record(row) for row in rows]
+
+    def queued(self, room):
+        '''Return a room's waiting list as (patient_no, priority) pairs, read from the triage table.'''
+        return self.conn.execute(SELECT_ROOM_QUEUE, {'room': room}).fetchall()
+
+    def queued_count(self, room):
+        return self.conn.execute(COUNT_ROOM_QUEUE, {'room': room}).fetchone()[0]
+
+    def iter_all(self, sort='patient_no'):
+        '''Yield every record dictionary in sort order (one of SORT_ORDERS), FETCH_SIZE rows at a time.'''
+        column = sort_column(sort)
+        cursor = self.conn.execute(SELECT_ALL if sort == 'patient_no' else SELECT_SORTED.format(column))
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                return
+            for row in rows:
+                yield to_record(row)
+
+    def import_patients(self, rows, progress=None, batch_size=IMPORT_BATCH):
+        '''
+        Add patients from (line number, {column: text}) rows, batch_size rows per transaction. Rows with a
+        patient number keep it, provided it is higher than any number issued so far (numbers are never
+        reused, even after a delete); the others get the next number.
+
+        Each batch is checked as a whole before it is written: every row against check_patient(), and the
+        patient numbers it brings against the last number issued. Rows that fail are skipped and reported;
+        the rest of the batch is still added. progress(added) is called after each batch.
+        Returns (number added, [(line number, error message), ...] in line order).
+        '''
+        added = 0
+        errors = []
+        seen = set()    # Patient numbers brought by earlier rows of the file
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                errors.sort()
+                return added, errors
+            checked = []
+            for line, fields in batch:
+                try:
+                    params = check_patient(fields)
+                except ValueError as e:
+                    errors.append((line, str(e)))
+                    continue
+                if params['patient_no'] is not None:
+                    if params['patient_no'] in seen:
+                        errors.append((line, "patient no. %d appears twice" % params['patient_no']))
+                        continue
+                    seen.add(params['patient_no'])
+                checked.append((line, params))
+            with self.transaction() as conn:
+                last_issued = conn.execute(SELECT_LAST_ISSUED_NO).fetchone()[0]
+                for line, params in checked:
+                    if params['patient_no'] is not None and params['patient_no'] <= last_issued:
+                        errors.append((line, "patient no. %d has already been issued" % params['patient_no']))
+                checked = [(line, params) for line, params in checked
+                           if params['patient_no'] is None or params['patient_no'] > last_issued]
+                numbered = [params for _, params in checked if params['patient_no'] is not None]
+                unnumbered = [params for _, params in checked if params['patient_no'] is None]
+                if self.has_fts:
+                    # Feeding the disease index row by row makes the import ~3x slower than one bulk insert
+                    conn.execute(DROP_FTS_INSERT_TRIGGER)
+                conn.executemany(INSERT_NUMBERED_PATIENT, numbered)
+                conn.executemany(INSERT_PATIENT, unnumbered)
+                if self.has_fts:
+                    conn.execute(INDEX_IMPORTED, {'after_no': last_issued})
+                    conn.execute(CREATE_FTS[1])
+            added += len(checked)
+            if progress:
+                progress(added)
+
+    def close(self):
+        self.conn.close()
+
+
+class StoreMaintenance:
+    '''
+    Background thread that looks after a store's files while it is in use.
+
+    Every CHECKPOINT_INTERVAL seconds it copies the committed log into the database (a passive
+    checkpoint, which never blocks readers or writers), so the log stays short and recovery after a
+    crash stays fast. Once VACUUM_THRESHOLD pages are free it also releases up to VACUUM_PAGES of
+    them; that takes the write lock, so writers wait for it briefly. When it stops it truncates the
+    log, waiting for readers and writers to finish. Every SNAPSHOT_INTERVAL seconds it writes a
+    consistent copy of the database with the backup API to `<db>.snapshot`, replacing the previous
+    snapshot only once the new one is complete.
+    '''
+
+    def __init__(self, path=DB_FILE, checkpoint_interval=CHECKPOINT_INTERVAL, snapshot_interval=SNAPSHOT_INTERVAL,
+                 snapshot_path=None):
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_path = snapshot_path or path + SNAPSHOT_SUFFIX
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='store-maintenance', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        '''Stop the thread after a final checkpoint that truncates the log.'''
+        self.stopping.set()
+        self.thread.join()
+
+    def _run(self):
+        conn = sqlite3.connect(self.path, isolation_level=None)
+        conn.execute("PRAGMA busy_timeout = 5000")
+        since_snapshot = 0
+        try:
+            while not self.stopping.wait(self.checkpoint_interval):
+                self.checkpoint(conn)
+                since_snapshot += self.checkpoint_interval
+                if self.snapshot_interval and since_snapshot >= self.snapshot_interval:
+                    self.snapshot(conn)
+                    since_snapshot = 0
+            self.checkpoint(conn, 'TRUNCATE')
+        finally:
+            conn.close()
+
+    def checkpoint(self, conn, mode='PASSIVE'):
+        '''
+        Checkpoint the log and release free pages. Returns (log frames, frames checkpointed).
+        Only a PASSIVE checkpoint never waits; TRUNCATE waits up to busy_timeout for readers and writers.
+        Releasing pages is a write transaction, so it is skipped until VACUUM_THRESHOLD pages are free.
+        '''
+        try:
+            _, frames, copied = conn.execute("PRAGMA wal_checkpoint(%s)" % mode).fetchone()
+            if conn.execute("PRAGMA freelist_count").fetchone()[0] >= VACUUM_THRESHOLD:
+                # Each step of the pragma frees one page; executescript() runs it to the end
+                conn.executescript("PRAGMA incremental_vacuum(%d)" % VACUUM_PAGES)
+            return frames, copied
+        except sqlite3.OperationalError:
+            # Busy; the next pass will catch up
+            return None
+
+    def snapshot(self, conn):
+        '''Write a consistent copy of the database to snapshot_path, atomically replacing the last one.'''
+        temporary = self.snapshot_path + '.tmp'
+        if os.path.exists(temporary):
+            os.remove(temporary)   # Left over from an interrupted snapshot
+        target = sqlite3.connect(temporary)
+        try:
+            conn.backup(target)
+        finally:
+            target.close()
+        with open(temporary, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(temporary, self.snapshot_path)
+
+
+class TriageQueues:
+    '''
+    Waiting queues for the specialist rooms: Emergency patients first, then O.P.D, first come first served
+    within each priority.
+
+    Each room's queue is a heap of (priority, seq, patient_no) entries, so enqueueing and calling the next
+    patient take O(log n). Reprioritizing or moving a patient pushes a new entry and leaves the old one in
+    the heap; entries that no longer match self.waiting are dropped when they reach the top, and a heap is
+    rebuilt once most of it is stale. Every change is also written to the triage table, which is loaded
+    back when the store is opened.
+    '''
+
+    def __init__(self, store):
+        self.store = store
+        self.heaps = {}
+        self.waiting = {}   # patient_no -> (priority, seq, room) for the patients in a queue
+        self.sizes = {}     # room -> number of patients waiting
+        self.next_seq = 1
+        for patient_no, room, priority, seq in store.conn.execute(SELECT_TRIAGE):
+            self.waiting[patient_no] = (priority, seq, room)
+            self.heaps.setdefault(room, []).append((priority, seq, patient_no))
+            self.sizes[room] = self.sizes.get(room, 0) + 1
+            self.next_seq = max(self.next_seq, seq + 1)
+        for heap in self.heaps.values():
+            heapq.heapify(heap)
+
+    def _push(self, patient_no, priority, seq, room):
+        previous = self.waiting.get(patient_no)
+        if previous == (priority, seq, room):
+            return      # Already in the heap; a second live entry would list the patient twice
+        if previous is not None:
+            self.sizes[previous[2]] -= 1
+        self.waiting[patient_no] = (priority, seq, room)
+        self.sizes[room] = self.sizes.get(room, 0) + 1
+        heap = self.heaps.setdefault(room, [])
+        heapq.heappush(heap, (priority, seq, patient_no))
+        if len(heap) > 2 * self.sizes[room] + 64:
+            self._compact(room)
+
+    def _is_current(self, entry, room):
+        priority, seq, patient_no = entry
+        return self.waiting.get(patient_no) == (priority, seq, room)
+
+    def _compact(self, room):
+        # Drop the stale entries in one O(n) pass
+        heap = [entry for entry in self.heaps[room] if self._is_current(entry, room)]
+        heapq.heapify(heap)
+        self.heaps[room] = heap
+
+    def enqueue(self, patient_no, room, priority=OPD):
+        '''Add a patient to the end of their priority in a room's queue (or move them there if already waiting).'''
+        with self.store.transaction() as conn:
+            seq = self.record(conn, patient_no, room, priority)
+        self.enqueued(patient_no, room, priority, seq)
+
+    def record(self, conn, patient_no, room, priority):
+        '''Write a queue entry inside the caller's transaction and return its seq; call enqueued() after the commit.'''
+        seq = self.next_seq
+        self.next_seq += 1
+        conn.execute(INSERT_TRIAGE, {'patient_no': patient_no, 'room': room, 'priority': priority, 'seq': seq})
+        return seq
+
+    def enqueued(self, patient_no, room, priority, seq):
+        '''Show a committed queue entry written by record() in the in-memory queue.'''
+        self._push(patient_no, priority, seq, room)
+
+    def next_patient(self, room):
+        '''Remove and return the patient number to be seen next in a room, or None if nobody is waiting.'''
+        heap = self.heaps.get(room)
+        while heap:
+            entry = heap[0]
+            if self._is_current(entry, room):
+                patient_no = entry[2]
+                # Only take the patient off the heap once the table agrees
+                with self.store.transaction() as conn:
+                    conn.execute(DELETE_TRIAGE, {'patient_no': patient_no})
+                heapq.heappop(heap)
+                del self.waiting[patient_no]
+                self.sizes[room] -= 1
+                return patient_no
+            heapq.heappop(heap)
+        return None
+
+    def reprioritize(self, patient_no, priority):
+        '''Change a waiting patient's priority, keeping their arrival order. Returns False if they are not waiting.'''
+        if patient_no not in self.waiting:
+            return False
+        _, seq, room = self.waiting[patient_no]
+        with self.store.transaction() as conn:
+            conn.execute(UPDATE_TRIAGE_PRIORITY, {'priority': priority, 'patient_no': patient_no})
+        self._push(patient_no, priority, seq, room)
+        return True
+
+    def moved(self, patient_no, room):
+        '''Follow a waiting patient who was referred to another room (the triage row is updated by a trigger).'''
+        if patient_no in self.waiting:
+            priority, seq, _ = self.waiting[patient_no]
+            self._push(patient_no, priority, seq, room)
+
+    def forget(self, patient_no):
+        '''Drop a deleted patient from the queues (the triage row is deleted by a trigger).'''
+        previous = self.waiting.pop(patient_no, None)
+        if previous is not None:
+            self.sizes[previous[2]] -= 1
+
+    def clear(self):
+        self.heaps.clear()
+        self.waiting.clear()
+        self.sizes.clear()
+
+    def size(self, room):
+        return self.sizes.get(room, 0)
+
+    def queue(self, room):
+        '''Return a room's waiting list in the order patients will be called, as (patient_no, priority) pairs.'''
+        entries = sorted(entry for entry in self.heaps.get(room, ()) if self._is_current(entry, room))
+        return [(patient_no, priority) for priority, _, patient_no in entries]
+
+    def rooms(self):
+        '''Return the rooms that have patients waiting.'''
+        return sorted(room for room, size in self.sizes.items() if size)
+
+
+def read_legacy_records(path=LEGACY_FILE):
+    '''
+    Return the records assigned in a PatientRecords.py file as {patient number: record dictionary}.
+
+    The file is parsed, not imported; only `patientN = {...}` assignments of literal dictionaries are read.
+    A number assigned more than once keeps its last value, as it would have when the module was imported.
+    '''
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    records = {}
+    for node in tree.body:
+        if not isinstance(node, ast.Assign) or not isinstance(node.value, ast.Dict):
+            continue
+        for target in node.targets:
+            match = LEGACY_NAME.match(target.id) if isinstance(target, ast.Name) else None
+            if match:
+                records[int(match.group(1))] = ast.literal_eval(node.value)
+    return records
+
+
+def migrate_patient_records(store, path=LEGACY_FILE):
+    '''
+    Copy the records in a legacy PatientRecords.py into the store, then rename the file to *.migrated
+    so it is only migrated once. Records whose patient number the store has already issued (in use or
+    deleted) are skipped, as numbers are never reused; they are still in the *.migrated file.
+    Returns (number of records copied, [skipped patient numbers]).
+    '''
+    if not os.path.exists(path):
+        return 0, []
+    records = read_legacy_records(path)
+    with store.transaction() as conn:
+        last_issued = conn.execute(SELECT_LAST_ISSUED_NO).fetchone()[0]
+        taken = [number for number in sorted(records) if number <= last_issued]
+        for number in taken:
+            del records[number]
+        conn.executemany(INSERT_NUMBERED_PATIENT, [{
+            'patient_no': number,
+            'name': record.get('Name', ''),
+            'address': record.get('Address'),
+            'age': record.get('Age'),
+            'sex': record.get('Sex'),
+            'disease': record.get('Disease Description'),
+            'specialist_room': record.get('Referred Specialist room no.')
+        } for number, record in sorted(records.items())])
+    os.replace(path, path + '.migrated')
+    return len(records), taken
+
+
+def read_csv_patients(f):
+    '''Yield (line number, {column: text}) for each row of a patient CSV file, matching its header to CSV_ALIASES.'''
+    reader = csv.reader(f)
+    header = [column.strip().lower() for column in next(reader, [])]
+    columns = {}
+    for column, aliases in CSV_ALIASES.items():
+        for alias in aliases:
+            if alias in header:
+                columns[column] = header.index(alias)
+                break
+    missing = [column for column in CSV_REQUIRED if column not in columns]
+    if missing:
+        raise ValueError("CSV file has no %s column" % ', '.join(missing))
+    for row in reader:
+        if any(row):
+            yield reader.line_num, {column: row[i] for column, i in columns.items() if i < len(row)}
+
+
+def import_csv(store, path, progress=None):
+    '''Add the patients in a CSV file to the store. Returns (number added, [(line number, error), ...]).'''
+    # utf-8-sig drops the byte order mark spreadsheet programs write
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return store.import_patients(read_csv_patients(f), progress)
+
+
+def export_csv(store, path, sort='patient_no'):
+    '''Write every patient to a CSV file in sort order, streaming them from the store. Returns the number written.'''
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow([column for _, column in FIELDS])
+        for count, record in enumerate(store.iter_all(sort), 1):
+            writer.writerow(record.values())
+    return count
@@ -1,25 +1,317 @@
 import json
 import os
+import errno
 import hashlib
 import logging
+import logging.handlers
+import queue
 import subprocess
 import sys
 import ctypes
 import shutil
+import socket
+import struct
+import select
+import threading
+import argparse
+import time
+import ipaddress
+import contextlib
+import http.server
+import asyncio
+import zlib
+import multiprocessing
 import psutil
-from typing import Dict, List, Optional, Set
+from collections import deque, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
 
 # Constants for file paths and logging
 LOG_FILE = 'incident_monitor.log'
 QUARANTINE_DIR = 'quarantine'
+LOG_MAX_BYTES = 50 * 1024 * 1024
+LOG_ROTATE_INTERVAL = 24 * 60 * 60
+LOG_BACKUP_COUNT = 10
 
-# Configure logging with function and module names included
-logging.basicConfig(
-    level=logging.INFO,
-    filename=LOG_FILE,
-    filemode='a',
-    format='%(asctime)s - %(levelname)s - %(module)s - %(funcName)s - %(message)s'
-)
+# Structured fields copied from a record's `extra` into its JSON line
+LOG_FIELDS = ('action', 'pid', 'pids', 'exe', 'hash', 'signature', 'ip', 'host')
+
+# Agent mode: detections are batched and sent to a collector as length-prefixed, zlib-compressed JSON frames
+AGENT_ACTIONS = frozenset({'connection', 'blocked', 'detected', 'terminated', 'killed', 'quarantined', 'terminate_failed'})
+AGENT_BATCH_SIZE = 500
+AGENT_FLUSH_INTERVAL = 5.0
+AGENT_MAX_QUEUED = 100000
+AGENT_RECONNECT_DELAY = 1.0
+AGENT_MAX_RECONNECT_DELAY = 60.0
+FRAME_HEADER = struct.Struct('!I')
+# Limit on a frame's size both as sent and once decompressed
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+COLLECTOR_REPORT_INTERVAL = 60.0
+
+# How often the IOC feed file is checked for changes while the monitor keeps running
+FEED_POLL_INTERVAL = 5.0
+
+# Scan metrics are served in Prometheus text format on this address when enabled
+METRICS_HOST = '127.0.0.1'
+STAGE_DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Linux exposes sockets and processes directly under /proc; reading them avoids
+# building a psutil object for every socket and process on the host
+PROC_ROOT = '/proc'
+USE_PROC_FASTPATH = sys.platform.startswith('linux') and os.path.isdir(os.path.join(PROC_ROOT, 'net'))
+TCP_ESTABLISHED = '01'
+
+# Lightweight stand-ins for psutil's connection tuples, carrying only the fields PyContain uses
+Address = namedtuple('Address', ['ip', 'port'])
+Connection = namedtuple('Connection', ['laddr', 'raddr', 'status'])
+
+# Immutable lookup tables built from one version of the IOC feed; signature_sizes is
+# None unless every signature records its file size
+IOCIndex = namedtuple('IOCIndex', ['malicious_ips', 'signature_index', 'signature_sizes'])
+
+# Paths sent to each hashing process at a time during a file sweep
+SWEEP_CHUNK_SIZE = 64
+
+# Firewall objects created by PyContain
+NFT_TABLE = 'pycontain'
+NETSH_RULE_PREFIX = 'PyContain Block'
+NETSH_MAX_ADDRESSES_PER_RULE = 1000
+
+# Response actions: seconds to wait after terminate() before escalating to kill(), and after kill()
+TERMINATE_GRACE_PERIOD = 10
+KILL_TIMEOUT = 5
+# How often those waits check whether the processes have stopped
+STOP_POLL_INTERVAL = 0.1
+RESPONSE_WORKERS = 4
+
+# Hashes of executables already seen, keyed by (device, inode, size, mtime) so a
+# replaced or modified file is hashed again
+HASH_CACHE_SIZE = 65536
+_file_hash_cache: Dict[Tuple[int, int, int, int], str] = {}
+
+# Netlink process connector constants (linux/connector.h, linux/cn_proc.h)
+NETLINK_CONNECTOR = 11
+CN_IDX_PROC = 1
+CN_VAL_PROC = 1
+NLMSG_DONE = 3
+PROC_CN_MCAST_LISTEN = 1
+PROC_EVENT_EXEC = 0x00000002
+NLMSG_HEADER = struct.Struct('=IHHII')
+CN_MSG_HEADER = struct.Struct('=IIIIHH')
+PROC_EVENT_HEADER = struct.Struct('=IIQ')
+PROC_EXEC_EVENT = struct.Struct('=II')
+
+# How often the /proc fallback looks for new PIDs when the proc connector is unavailable
+PROC_POLL_INTERVAL = 0.05
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    Format log records as one JSON object per line, including any structured fields in LOG_FIELDS.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'module': record.module,
+            'function': record.funcName,
+            'message': record.getMessage(),
+        }
+        for field in LOG_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class SizeAndTimeRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Rotate the log file when it exceeds a size or when a time interval has passed, whichever comes first.
+
+    Args:
+        filename (str): The log file path.
+        max_bytes (int): Rotate once the file would grow beyond this size.
+        rotate_interval (float): Rotate at least this often, in seconds.
+        backup_count (int): The number of rotated files to keep.
+    """
+
+    def __init__(self, filename: str, max_bytes: int, rotate_interval: float, backup_count: int) -> None:
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+        self.rotate_interval = rotate_interval
+        self.rollover_at = time.time() + rotate_interval
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if time.time() >= self.rollover_at:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self) -> None:
+        super().doRollover()
+        self.rollover_at = time.time() + self.rotate_interval
+
+def configure_logging(log_file: str = LOG_FILE, max_bytes: int = LOG_MAX_BYTES,
+                      rotate_interval: float = LOG_ROTATE_INTERVAL,
+                      backup_count: int = LOG_BACKUP_COUNT) -> logging.handlers.QueueListener:
+    """
+    Route all logging through a queue to a background thread that writes rotating JSON-lines files.
+
+    The scan loop only pays for putting a record on the queue; formatting and disk writes happen
+    on the listener's thread.
+
+    Args:
+        log_file (str): The log file path (default is LOG_FILE).
+        max_bytes (int): Rotate the file once it reaches this size.
+        rotate_interval (float): Rotate the file at least this often, in seconds.
+        backup_count (int): The number of rotated files to keep.
+
+    Returns:
+        logging.handlers.QueueListener: The started listener; call stop() to flush it on exit.
+    """
+    file_handler = SizeAndTimeRotatingFileHandler(log_file, max_bytes, rotate_interval, backup_count)
+    file_handler.setFormatter(JsonLinesFormatter())
+
+    log_queue: queue.Queue = queue.Queue(-1)
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    root_logger.setLevel(logging.INFO)
+
+    listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+class ScanMetrics:
+    """
+    Thread-safe counters, gauges and per-stage duration histograms for the scan loop.
+    """
+
+    COUNTER_HELP = {
+        'pycontain_scan_cycles_total': "Completed full scan cycles.",
+        'pycontain_scan_overruns_total': "Scan cycles that took longer than the scan interval.",
+        'pycontain_connections_scanned_total': "Established connections checked against the malicious IP list.",
+        'pycontain_processes_scanned_total': "Processes checked against the suspicious program signatures.",
+        'pycontain_hash_cache_hits_total': "Executable hashes served from the hash cache.",
+        'pycontain_hashes_computed_total': "Executable hashes computed from file contents.",
+        'pycontain_ip_matches_total': "Connections to malicious IP addresses found.",
+        'pycontain_program_matches_total': "Processes running a suspicious program found.",
+        'pycontain_blocks_total': "IP addresses blocked in the firewall.",
+        'pycontain_processes_terminated_total': "Suspicious processes stopped.",
+        'pycontain_files_quarantined_total': "Executables moved to quarantine.",
+        'pycontain_feed_reloads_total': "IOC feed reloads swapped in.",
+        'pycontain_event_overruns_total': "Process event buffer overruns, each followed by a full /proc rescan.",
+        'pycontain_files_swept_total': "Files visited by on-disk sweeps.",
+        'pycontain_sweep_candidates_total': "Swept files whose size matched a signature and were hashed or looked up.",
+        'pycontain_file_matches_total': "Files on disk matching a suspicious program signature.",
+    }
+    GAUGE_HELP = {
+        'pycontain_last_cycle_duration_seconds': "Duration of the most recent scan cycle.",
+        'pycontain_scan_interval_seconds': "Configured interval between scan cycles.",
+    }
+
+    def __init__(self, buckets: Tuple[float, ...] = STAGE_DURATION_BUCKETS) -> None:
+        self.buckets = buckets
+        self._counters: Dict[str, float] = dict.fromkeys(self.COUNTER_HELP, 0)
+        self._gauges: Dict[str, float] = dict.fromkeys(self.GAUGE_HELP, 0)
+        # stage -> [count per bucket..., total count, sum of durations]
+        self._histograms: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1) -> None:
+        """Increase a counter."""
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """Set a gauge to the given value."""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Record the duration of one run of a stage."""
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[i] += 1
+                    break
+            histogram[-2] += 1
+            histogram[-1] += seconds
+
+    @contextlib.contextmanager
+    def time_stage(self, stage: str) -> Iterator[None]:
+        """Time the enclosed block and record it as a run of the given stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def snapshot(self) -> Dict[str, float]:
+        """Return the current counter and gauge values."""
+        with self._lock:
+            return {**self._counters, **self._gauges}
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, value in self._counters.items():
+                lines += [f'# HELP {name} {self.COUNTER_HELP[name]}', f'# TYPE {name} counter', f'{name} {value}']
+            for name, value in self._gauges.items():
+                lines += [f'# HELP {name} {self.GAUGE_HELP[name]}', f'# TYPE {name} gauge', f'{name} {value}']
+            name = 'pycontain_stage_duration_seconds'
+            lines += [f'# HELP {name} Duration of each scan stage.', f'# TYPE {name} histogram']
+            for stage, histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, histogram):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram[-2]}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {histogram[-1]}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {histogram[-2]}')
+        return '\n'.join(lines) + '\n'
+
+# Metrics for this process, updated by the scan functions
+METRICS = ScanMetrics()
+
+class _MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Serve METRICS on /metrics."""
+
+    def do_GET(self) -> None:
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = METRICS.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        # Scrapes are frequent; keep them out of the incident log
+        pass
+
+def start_metrics_server(port: int, host: str = METRICS_HOST) -> http.server.ThreadingHTTPServer:
+    """
+    Serve the scan metrics in Prometheus text format on a background thread.
+
+    Args:
+        port (int): The TCP port to listen on.
+        host (str): The address to bind (default is the loopback address).
+
+    Returns:
+        http.server.ThreadingHTTPServer: The running server; call shutdown() to stop it.
+    """
+    server = http.server.ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    logging.info(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
 
 def is_running_as_admin() -> bool:
     """
@@ -29,6 +321,8 @@ def is_running_as_admin() -> bool:
         bool: True if running with elevated privileges, False otherwise.
     """
     try:
+        if os.name != 'nt':
+            return os.geteuid() == 0
         return ctypes.windll.shell32.IsUserAnAdmin() != 0
     except Exception as e:
         logging.error(f"Error checking admin privileges: {e}")
@@ -44,6 +338,10 @@ def run_as_admin() -> None:
         Terminates the script if unable to restart with elevated permissions.
     """
     if not is_running_as_admin():
+        if os.name != 'nt':
+            logging.warning("The script is not running as root; blocking and quarantine actions may fail.")
+            return
+
         script_path = os.path.abspath(sys.argv[0])
         logging.info("The script requires administrative privileges. Attempting to restart with elevated permissions...")
 
@@ -80,17 +378,63 @@ def load_json_file(json_file_path: str) -> Optional[Dict]:
         logging.error(f"Error loading JSON file: {e}")
         return None
 
-def get_active_network_connections() -> List[psutil._common.sconn]:
+def _decode_proc_address(address: str, family: int) -> Address:
+    """
+    Decode an address from /proc/net/tcp{,6}, e.g. '0100007F:0050' -> ('127.0.0.1', 80).
+
+    The kernel prints the address as 32-bit words in host byte order and the port in hex.
+    """
+    hex_ip, hex_port = address.split(':')
+    packed = bytes.fromhex(hex_ip)
+    if sys.byteorder == 'little':
+        packed = b''.join(packed[i:i + 4][::-1] for i in range(0, len(packed), 4))
+    return Address(socket.inet_ntop(family, packed), int(hex_port, 16))
+
+def read_proc_connections(proc_root: str = PROC_ROOT) -> List[Connection]:
+    """
+    Read established TCP connections straight from /proc/net/tcp and /proc/net/tcp6.
+
+    Args:
+        proc_root (str): Mount point of procfs (default is '/proc').
+
+    Returns:
+        list: Established connections with 'laddr', 'raddr' and 'status' fields.
+    """
+    connections = []
+    for file_name, family in (('tcp', socket.AF_INET), ('tcp6', socket.AF_INET6)):
+        try:
+            with open(os.path.join(proc_root, 'net', file_name), 'r') as file:
+                next(file, None)  # Skip the header line
+                for line in file:
+                    fields = line.split(None, 4)
+                    # Filter by state before decoding anything else
+                    if len(fields) < 4 or fields[3] != TCP_ESTABLISHED:
+                        continue
+                    connections.append(Connection(
+                        _decode_proc_address(fields[1], family),
+                        _decode_proc_address(fields[2], family),
+                        'ESTABLISHED'
+                    ))
+        except FileNotFoundError:
+            # IPv6 may be disabled on the host
+            continue
+    return connections
+
+def get_active_network_connections() -> List[Connection]:
     """
     Retrieve a list of active network connections on the system.
 
+    On Linux the connections are parsed from /proc directly; elsewhere psutil is used.
+
     Returns:
-        list: A list of active network connections represented as psutil.Connection objects.
+        list: A list of established connections, each with 'laddr', 'raddr' and 'status' fields.
 
     Raises:
         Exception: If unable to retrieve network connections.
     """
     try:
+        if USE_PROC_FASTPATH:
+            return read_proc_connections()
         connections = psutil.net_connections(kind='inet')
         # Filter connections to only keep established connections
         established_connections = [conn for conn in connections if conn.status == 'ESTABLISHED']
@@ -99,18 +443,21 @@ def get_active_network_connections() -> List[psutil._common.sconn]:
         logging.error(f"Error getting active network connections: {e}")
         return []
 
-def check_malicious_ips(active_connections: List[psutil._common.sconn], malicious_ips: Set[str]) -> None:
+def check_malicious_ips(active_connections: List[Connection], malicious_ips: Set[str],
+                        blocker: 'FirewallBlocker') -> None:
     """
     Check active network connections against a set of malicious IP addresses.
 
     Args:
         active_connections (list): A list of active network connections.
         malicious_ips (set): A set of malicious IP addresses.
+        blocker (FirewallBlocker): Collects the addresses to block at the end of the scan cycle.
 
     Side Effects:
         Logs a warning message if an active connection to a malicious IP address is found.
-        Blocks outbound traffic to the malicious IP address using a firewall rule.
+        Queues the malicious IP address for blocking.
     """
+    METRICS.inc('pycontain_connections_scanned_total', len(active_connections))
     checked_ips = set()
     for conn in active_connections:
         remote_ip = conn.raddr.ip
@@ -121,92 +468,406 @@ def check_malicious_ips(active_connections: List[psutil._common.sconn], maliciou
 
         # Check if the remote IP is in the set of malicious IPs
         if remote_ip in malicious_ips:
-            logging.warning(f"Active connection to malicious IP address: {remote_ip}")
-            block_malicious_ip(remote_ip)
+            logging.warning(f"Active connection to malicious IP address: {remote_ip}",
+                            extra={'action': 'connection', 'ip': remote_ip})
+            METRICS.inc('pycontain_ip_matches_total')
+            blocker.request(remote_ip)
 
         checked_ips.add(remote_ip)
 
-def block_malicious_ip(ip_address: str) -> None:
+class FirewallBackend:
+    """
+    Interface for applying outbound block rules. Subclasses block a whole batch of addresses at once.
     """
-    Block outbound traffic to the given malicious IP address using a firewall rule.
 
-    Args:
-        ip_address (str): The IP address to block.
+    # Whether the backend needs administrative privileges to apply rules
+    requires_admin = True
 
-    Side Effects:
-        Logs a message indicating the IP address has been blocked.
-        If the script is not running with administrative privileges, logs a warning message.
+    def block(self, ip_addresses: List[str]) -> None:
+        """
+        Block outbound traffic to every address in the batch.
+
+        Args:
+            ip_addresses (list): The IP addresses to block.
+
+        Raises:
+            subprocess.CalledProcessError: If the firewall tool rejects the update.
+        """
+        raise NotImplementedError
+
+class DryRunFirewallBackend(FirewallBackend):
     """
-    if is_running_as_admin():
-        try:
+    Record and log blocks without touching the firewall; used for testing and with --dry-run.
+    """
+
+    requires_admin = False
+
+    def __init__(self) -> None:
+        self.batches: List[List[str]] = []
+
+    def block(self, ip_addresses: List[str]) -> None:
+        self.batches.append(list(ip_addresses))
+        for ip in ip_addresses:
+            logging.info(f"[dry run] Would block IP address: {ip}", extra={'action': 'block_dry_run', 'ip': ip})
+
+class NftablesFirewallBackend(FirewallBackend):
+    """
+    Block addresses on Linux by adding them to nftables sets matched by a single drop rule.
+
+    Adding set elements is idempotent and a whole batch is applied with one 'nft -f -' call.
+    """
+
+    def __init__(self, table: str = NFT_TABLE) -> None:
+        self.table = table
+        self._ready = False
+
+    def _run(self, script: str) -> None:
+        subprocess.run(['nft', '-f', '-'], input=script, text=True, check=True, capture_output=True)
+
+    def _setup(self) -> None:
+        """Create the table, address sets and output chain if missing, preserving existing set elements."""
+        table = f'inet {self.table}'
+        self._run(
+            f'add table {table}\n'
+            f'add set {table} blocked_ipv4 {{ type ipv4_addr; }}\n'
+            f'add set {table} blocked_ipv6 {{ type ipv6_addr; }}\n'
+            f'add chain {table} output {{ type filter hook output priority 0; policy accept; }}\n'
+            f'flush chain {table} output\n'
+            f'add rule {table} output ip daddr @blocked_ipv4 drop\n'
+            f'add rule {table} output ip6 daddr @blocked_ipv6 drop\n'
+        )
+        self._ready = True
+
+    def block(self, ip_addresses: List[str]) -> None:
+        if not self._ready:
+            self._setup()
+        by_set: Dict[str, List[str]] = {'blocked_ipv4': [], 'blocked_ipv6': []}
+        for ip in ip_addresses:
+            by_set['blocked_ipv4' if ipaddress.ip_address(ip).version == 4 else 'blocked_ipv6'].append(ip)
+        self._run(''.join(
+            f'add element inet {self.table} {set_name} {{ {", ".join(ips)} }}\n'
+            for set_name, ips in by_set.items() if ips
+        ))
+
+class NetshFirewallBackend(FirewallBackend):
+    """
+    Block addresses on Windows with one 'netsh advfirewall' rule per batch of addresses.
+
+    Rules are named after a hash of their addresses, and addresses already blocked by a PyContain
+    rule (e.g. from an earlier run) are skipped, so restarts do not pile up duplicate rules.
+    """
+
+    def __init__(self) -> None:
+        self._blocked: Set[str] = set()
+        self._ready = False
+
+    def _setup(self) -> None:
+        """Collect the addresses blocked by existing PyContain rules."""
+        result = subprocess.run(['netsh', 'advfirewall', 'firewall', 'show', 'rule', 'name=all', 'dir=out'],
+                                check=True, capture_output=True, text=True)
+        rule_name = ''
+        for line in result.stdout.splitlines():
+            key, _, value = line.partition(':')
+            key, value = key.strip(), value.strip()
+            if key == 'Rule Name':
+                rule_name = value
+            elif key == 'RemoteIP' and rule_name.startswith(NETSH_RULE_PREFIX):
+                # Single addresses are listed as 1.2.3.4/32 or 2001:db8::1/128
+                for address in value.split(','):
+                    ip, _, prefix = address.partition('/')
+                    if prefix in ('', '32', '128'):
+                        self._blocked.add(ip)
+        self._ready = True
+
+    def block(self, ip_addresses: List[str]) -> None:
+        if not self._ready:
+            self._setup()
+        new_addresses = [ip for ip in ip_addresses if ip not in self._blocked]
+        for start in range(0, len(new_addresses), NETSH_MAX_ADDRESSES_PER_RULE):
+            chunk = new_addresses[start:start + NETSH_MAX_ADDRESSES_PER_RULE]
+            digest = hashlib.sha256(','.join(sorted(chunk)).encode()).hexdigest()[:16]
             subprocess.run(
-                f'netsh advfirewall firewall add rule name="Block Malicious IP" '
-                f'dir=out action=block remoteip={ip_address}',
-                shell=True,
-                check=True
+                ['netsh', 'advfirewall', 'firewall', 'add', 'rule',
+                 f'name={NETSH_RULE_PREFIX} {digest}',
+                 'dir=out', 'action=block', f'remoteip={",".join(chunk)}'],
+                check=True,
+                capture_output=True
             )
-            logging.info(f"Blocked malicious IP address: {ip_address}")
-        except subprocess.CalledProcessError as e:
-            logging.error(f"Error blocking malicious IP {ip_address}: {e}")
-    else:
-        logging.warning(f"Cannot block IP {ip_address} due to lack of administrative privileges.")
+            self._blocked.update(chunk)
+
+def default_firewall_backend(dry_run: bool = False) -> FirewallBackend:
+    """
+    Choose the firewall backend for the current platform.
+
+    Args:
+        dry_run (bool): Log blocks instead of applying them (default is False).
+
+    Returns:
+        FirewallBackend: The backend to use.
+    """
+    if dry_run:
+        return DryRunFirewallBackend()
+    if os.name == 'nt':
+        return NetshFirewallBackend()
+    if sys.platform.startswith('linux') and shutil.which('nft'):
+        return NftablesFirewallBackend()
+    logging.warning("No supported firewall found; malicious IPs will only be logged.")
+    return DryRunFirewallBackend()
+
+class FirewallBlocker:
+    """
+    Track blocked IP addresses and apply newly requested blocks in one batch per scan cycle.
+
+    Args:
+        backend (FirewallBackend): Applies the rules (default is the platform's backend).
+    """
+
+    def __init__(self, backend: Optional[FirewallBackend] = None) -> None:
+        self.backend = backend or default_firewall_backend()
+        self.blocked: Set[str] = set()
+        self._pending: Dict[str, None] = {}
+        self._lock = threading.Lock()
+
+    def request(self, ip_address: str) -> None:
+        """
+        Queue an IP address for blocking unless it is already blocked or queued.
+
+        Args:
+            ip_address (str): The IP address to block.
+        """
+        with self._lock:
+            if ip_address not in self.blocked:
+                self._pending[ip_address] = None
+
+    def flush(self) -> int:
+        """
+        Apply all queued blocks in a single firewall update.
+
+        Returns:
+            int: The number of newly blocked IP addresses.
+
+        Side Effects:
+            Logs the blocked addresses. Addresses that failed to block stay queued for the next flush.
+        """
+        with self._lock:
+            batch = list(self._pending)
+            self._pending.clear()
+        if not batch:
+            return 0
+
+        if self.backend.requires_admin and not is_running_as_admin():
+            logging.warning(f"Cannot block {len(batch)} IP addresses due to lack of administrative privileges: "
+                            f"{', '.join(batch)}")
+            return 0
+
+        try:
+            self.backend.block(batch)
+        except (OSError, subprocess.CalledProcessError) as e:
+            logging.error(f"Error blocking {len(batch)} malicious IP addresses: {e}")
+            with self._lock:
+                for ip in batch:
+                    self._pending.setdefault(ip, None)
+            return 0
+
+        with self._lock:
+            self.blocked.update(batch)
+        METRICS.inc('pycontain_blocks_total', len(batch))
+        for ip in batch:
+            logging.info(f"Blocked malicious IP address: {ip}", extra={'action': 'blocked', 'ip': ip})
+        return len(batch)
+
+def read_proc_process(pid: int, proc_root: str = PROC_ROOT) -> Optional[Dict]:
+    """
+    Read the PID, name and executable path of a single process from /proc/<pid>.
+
+    Args:
+        pid (int): The PID of the process.
+        proc_root (str): Mount point of procfs (default is '/proc').
+
+    Returns:
+        dict: The process information ('pid', 'name', 'exe'), or None if the process has exited.
+            'exe' is '' for kernel threads and None when the executable link cannot be read. If the
+            executable has been deleted, 'exe' is the /proc/<pid>/exe link, which still opens its content.
+    """
+    proc_dir = os.path.join(proc_root, str(pid))
+    try:
+        with open(os.path.join(proc_dir, 'comm'), 'r') as file:
+            name = file.read().rstrip('\n')
+    except (FileNotFoundError, ProcessLookupError):
+        return None
+    except OSError:
+        name = None
+
+    try:
+        exe = os.readlink(os.path.join(proc_dir, 'exe'))
+        if exe.endswith(' (deleted)') and not os.path.exists(exe):
+            # A self-deleting binary: its old path is gone, so stat and hash it through the link
+            exe = os.path.join(proc_dir, 'exe')
+    except FileNotFoundError:
+        # Kernel threads have no executable
+        exe = ''
+    except OSError:
+        exe = None
+
+    # The kernel truncates comm to 15 characters; recover the full name from the executable
+    if name and exe and len(name) >= 15 and os.path.basename(exe).startswith(name):
+        name = os.path.basename(exe)
+    return {'pid': pid, 'name': name, 'exe': exe}
+
+def iter_proc_pids(proc_root: str = PROC_ROOT) -> Iterator[int]:
+    """
+    Yield the PIDs of all processes listed in /proc.
+
+    Args:
+        proc_root (str): Mount point of procfs (default is '/proc').
+
+    Yields:
+        int: A process ID.
+    """
+    with os.scandir(proc_root) as entries:
+        for entry in entries:
+            if entry.name.isdigit():
+                yield int(entry.name)
+
+def read_proc_processes(proc_root: str = PROC_ROOT) -> List[Dict]:
+    """
+    Read the PID, name and executable path of every process from /proc.
+
+    Args:
+        proc_root (str): Mount point of procfs (default is '/proc').
+
+    Returns:
+        list: A list of dictionaries with 'pid', 'name' and 'exe' keys.
+    """
+    processes = []
+    for pid in iter_proc_pids(proc_root):
+        info = read_proc_process(pid, proc_root)
+        if info:
+            processes.append(info)
+    return processes
 
 def get_running_processes() -> List[Dict]:
     """
     Retrieve a list of currently running processes on the system.
 
+    On Linux the processes are read from /proc directly; elsewhere psutil is used.
+
     Returns:
-        list: A list of dictionaries, each containing information about a running process (PID and name).
+        list: A list of dictionaries, each containing information about a running process (PID, name and exe).
 
     Raises:
         Exception: If unable to retrieve running processes.
     """
     try:
+        if USE_PROC_FASTPATH:
+            return read_proc_processes()
         return [proc.info for proc in psutil.process_iter(['pid', 'name', 'exe']) if proc.info]
     except Exception as e:
         logging.error(f"Error getting running processes: {e}")
         return []
 
-def check_suspicious_programs(running_processes: List[Dict], suspicious_programs: List[Dict]) -> None:
+def build_signature_index(suspicious_programs: List[Dict]) -> Dict[str, Dict]:
     """
-    Check running processes against a list of suspicious programs.
+    Index suspicious program signatures by their content hash.
 
     Args:
-        running_processes (list): A list of dictionaries, each containing information about a running process.
         suspicious_programs (list): A list of dictionaries, each containing a suspicious program's name and hash.
 
+    Returns:
+        dict: A dictionary mapping each lower-case hash to its signature.
+    """
+    return {sp['tlsh'].lower(): sp for sp in suspicious_programs if sp.get('tlsh')}
+
+def check_suspicious_programs(running_processes: List[Dict], signature_index: Dict[str, Dict],
+                              responder: 'ResponseExecutor') -> None:
+    """
+    Check the executables of running processes against known suspicious program hashes.
+
+    Processes are matched by the content of their executable, not by name, so renamed binaries
+    are caught. Each distinct executable (by path and inode) is hashed at most once per call,
+    however many processes run it.
+
+    Args:
+        running_processes (list): A list of dictionaries, each containing information about a running process.
+        signature_index (dict): A dictionary mapping suspicious program hashes to their signatures,
+            as returned by build_signature_index.
+        responder (ResponseExecutor): Terminates and quarantines the detections in the background.
+
     Side Effects:
         Logs a warning message if a suspicious program is detected.
-        Terminates the suspicious process and quarantines the executable file.
+        Hands the suspicious processes and their executables to the responder.
     """
-    # Convert suspicious programs from list to dict (name -> hash)
-    suspicious_programs_dict = {sp['name']: sp['tlsh'] for sp in suspicious_programs}
-
-    # Initialize set to keep track of checked processes
-    checked_process_names = set()
+    # Identity of each executable path seen during this scan, and the verdict for each identity
+    file_identities: Dict[str, Optional[Tuple[int, int]]] = {}
+    verdicts: Dict[Tuple[int, int], Tuple[Optional[Dict], str]] = {}
+    detections: Dict[str, List[int]] = {}
+    METRICS.inc('pycontain_processes_scanned_total', len(running_processes))
 
     for process in running_processes:
-        process_name = process.get('name')
         process_pid = process.get('pid')
         file_path = process.get('exe')
 
-        # Skip already checked processes
-        if process_name in checked_process_names:
+        # Kernel threads and processes we may not inspect have no executable path
+        if not file_path:
             continue
 
-        if process_name in suspicious_programs_dict:
-            # Compute file hash using SHA-256 instead of MD5
-            file_hash = compute_file_hash(file_path, hash_type='sha256')
+        if file_path not in file_identities:
+            try:
+                file_stat = os.stat(file_path)
+            except OSError:
+                file_identities[file_path] = None
+                continue
+            identity = (file_stat.st_dev, file_stat.st_ino)
+            file_identities[file_path] = identity
+
+            # Hard links share an inode, so only hash the content once
+            if identity not in verdicts:
+                file_hash = get_file_hash(file_path, file_stat)
+                verdicts[identity] = (signature_index.get(file_hash), file_hash)
+
+        identity = file_identities[file_path]
+        if identity is None:
+            continue
 
-            # Compare computed hash with known suspicious hash
-            if file_hash == suspicious_programs_dict[process_name]:
-                logging.warning(f"Suspicious program detected: {process_name} with hash: {file_hash}")
+        signature, file_hash = verdicts[identity]
+        if signature:
+            logging.warning(f"Suspicious program detected: {process.get('name')} (PID {process_pid}, {file_path}) "
+                            f"matches {signature.get('name')} with hash: {file_hash}",
+                            extra={'action': 'detected', 'pid': process_pid, 'exe': file_path,
+                                   'hash': file_hash, 'signature': signature.get('name')})
 
-                # Handle suspicious process and quarantine file
-                handle_suspicious_process(process_pid, file_path)
+            METRICS.inc('pycontain_program_matches_total')
+            detections.setdefault(file_path, []).append(process_pid)
 
-        # Add process name to checked set
-        checked_process_names.add(process_name)
+    # Terminate and quarantine all detections together without holding up the scan
+    if detections:
+        responder.respond(detections)
+
+def get_file_hash(file_path: str, file_stat: os.stat_result) -> str:
+    """
+    Return the SHA-256 hash of a file, reusing the result of earlier scans if the file is unchanged.
+
+    Args:
+        file_path (str): The file path of the file to hash.
+        file_stat (os.stat_result): The result of os.stat for the file.
+
+    Returns:
+        str: The computed hash of the file, or an empty string if it could not be read.
+    """
+    cache_key = (file_stat.st_dev, file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns)
+    file_hash = _file_hash_cache.get(cache_key)
+    if file_hash is not None:
+        METRICS.inc('pycontain_hash_cache_hits_total')
+    else:
+        with METRICS.time_stage('hash'):
+            file_hash = compute_file_hash(file_path, hash_type='sha256')
+        METRICS.inc('pycontain_hashes_computed_total')
+        if not file_hash:
+            return file_hash
+        if len(_file_hash_cache) >= HASH_CACHE_SIZE:
+            _file_hash_cache.clear()
+        _file_hash_cache[cache_key] = file_hash
+    return file_hash
 
 def compute_file_hash(file_path: str, hash_type: str = 'sha256') -> str:
     """
@@ -232,24 +893,93 @@ def compute_file_hash(file_path: str, hash_type: str = 'sha256') -> str:
         logging.error(f"Error computing file hash: {e}")
         return ""
 
-def handle_suspicious_process(process_pid: int, file_path: str) -> None:
+def _has_stopped(process: psutil.Process) -> bool:
+    """
+    Return True if a process has exited. A zombie counts as exited: it no longer runs, only its
+    parent has not reaped it, which malware may avoid doing on purpose.
+    """
+    try:
+        return process.status() == psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return True
+    except psutil.Error:
+        return False
+
+def wait_until_stopped(processes: List[psutil.Process], timeout: float) -> List[psutil.Process]:
     """
-    Handle suspicious processes by terminating them and quarantining the executable.
+    Wait for processes to exit, treating zombies as exited.
 
     Args:
-        process_pid (int): The PID of the suspicious process.
-        file_path (str): The file path of the executable associated with the suspicious process.
+        processes (list): The processes to wait for.
+        timeout (float): Seconds to wait at most.
 
-    Side Effects:
-        Terminates the suspicious process.
-        Moves the executable file to the quarantine directory.
+    Returns:
+        list: The processes still running when the timeout expired.
     """
-    try:
-        # Terminate the suspicious process
-        process = psutil.Process(process_pid)
-        process.terminate()
-        process.wait(timeout=10)  # Allow process time to terminate gracefully
+    deadline = time.monotonic() + timeout
+    alive = [process for process in processes if not _has_stopped(process)]
+    while alive:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        # wait_procs() alone would count an unreaped zombie as alive until the timeout
+        _, alive = psutil.wait_procs(alive, timeout=min(STOP_POLL_INTERVAL, remaining))
+        alive = [process for process in alive if not _has_stopped(process)]
+    return alive
 
+def terminate_processes(pids: List[int], grace_period: float = TERMINATE_GRACE_PERIOD,
+                        kill_timeout: float = KILL_TIMEOUT) -> List[int]:
+    """
+    Terminate processes, escalating to kill() for any that outlive the grace period.
+
+    Args:
+        pids (list): The PIDs of the processes to stop.
+        grace_period (float): Seconds to wait for the processes to exit after terminate().
+        kill_timeout (float): Seconds to wait for the processes to exit after kill().
+
+    Returns:
+        list: The PIDs of processes that are still running.
+    """
+    processes = []
+    for pid in pids:
+        try:
+            process = psutil.Process(pid)
+            process.terminate()
+            processes.append(process)
+        except psutil.NoSuchProcess:
+            logging.warning(f"No such process with PID: {pid}")
+        except psutil.Error as e:
+            logging.error(f"Error terminating process {pid}: {e}")
+
+    # Wait for the whole batch at once instead of one process at a time
+    alive = wait_until_stopped(processes, grace_period)
+    for process in alive:
+        logging.warning(f"Process {process.pid} ignored terminate; killing it",
+                        extra={'action': 'killed', 'pid': process.pid})
+        try:
+            process.kill()
+        except psutil.NoSuchProcess:
+            pass
+        except psutil.Error as e:
+            logging.error(f"Error killing process {process.pid}: {e}")
+    alive = wait_until_stopped(alive, kill_timeout)
+    return [process.pid for process in alive]
+
+def quarantine_file(file_path: str) -> Optional[str]:
+    """
+    Move a suspicious executable into the quarantine directory next to it.
+
+    Args:
+        file_path (str): The file path of the executable.
+
+    Returns:
+        str: The new path of the file, or None if it could not be quarantined.
+    """
+    if not os.path.exists(file_path):
+        # Deleted executables are only reachable through /proc/<pid>/exe until their processes stop
+        logging.warning(f"File no longer exists, nothing to quarantine: {file_path}")
+        return None
+    try:
         # Create quarantine directory if not already present
         quarantine_path = os.path.join(os.path.dirname(file_path), QUARANTINE_DIR)
         os.makedirs(quarantine_path, exist_ok=True)
@@ -258,42 +988,966 @@ def handle_suspicious_process(process_pid: int, file_path: str) -> None:
         quarantine_file_path = os.path.join(quarantine_path, os.path.basename(file_path))
         shutil.move(file_path, quarantine_file_path)
 
-        logging.info(f"Suspicious process {process_pid} terminated and file moved to quarantine: {quarantine_file_path}")
-    except psutil.NoSuchProcess:
-        logging.warning(f"No such process with PID: {process_pid}")
+        logging.info(f"File moved to quarantine: {quarantine_file_path}",
+                     extra={'action': 'quarantined', 'exe': file_path})
+        return quarantine_file_path
     except Exception as e:
-        logging.error(f"Error handling suspicious process: {e}")
+        logging.error(f"Error quarantining file {file_path}: {e}")
+        return None
 
-def main() -> None:
+class ResponseExecutor:
     """
-    Main function to coordinate the monitoring and handling of incidents on the Windows machine.
+    Carry out response actions for suspicious processes on background threads.
 
-    The function performs the following tasks:
-    1. Ensures the script is running with administrative privileges.
-    2. Loads data from a JSON file containing malicious IPs and suspicious programs.
-    3. Checks active network connections for connections to malicious IPs.
-    4. Checks running processes for suspicious programs.
+    Each batch of detections is terminated together (terminate, then kill after the grace period)
+    and the executables are then quarantined in parallel. Processes that already have a response
+    in flight are not handled twice.
+
+    Args:
+        max_workers (int): The number of response threads.
+        grace_period (float): Seconds to wait after terminate() before escalating to kill().
+    """
+
+    def __init__(self, max_workers: int = RESPONSE_WORKERS, grace_period: float = TERMINATE_GRACE_PERIOD) -> None:
+        self.grace_period = grace_period
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='response')
+        self._in_flight: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def respond(self, detections: Dict[str, List[int]]) -> Optional[Future]:
+        """
+        Schedule termination of the detected processes and quarantine of their executables.
+
+        Args:
+            detections (dict): A dictionary mapping executable paths to the PIDs running them.
+
+        Returns:
+            Future: Completes when the processes are stopped, or None if every process was already being handled.
+        """
+        with self._lock:
+            batch = {}
+            for file_path, pids in detections.items():
+                new_pids = [pid for pid in pids if pid not in self._in_flight]
+                if new_pids:
+                    batch[file_path] = new_pids
+                    self._in_flight.update(new_pids)
+        if not batch:
+            return None
+        return self._executor.submit(self._respond, batch)
+
+    def _respond(self, batch: Dict[str, List[int]]) -> None:
+        all_pids = [pid for pids in batch.values() for pid in pids]
+        start = time.perf_counter()
+        try:
+            survivors = set(terminate_processes(all_pids, self.grace_period))
+            METRICS.inc('pycontain_processes_terminated_total', len(set(all_pids) - survivors))
+            stopped_files = []
+            for file_path, pids in batch.items():
+                if survivors.intersection(pids):
+                    logging.error(f"Could not stop processes {sorted(survivors.intersection(pids))}; "
+                                  f"not quarantining {file_path}",
+                                  extra={'action': 'terminate_failed', 'pids': pids, 'exe': file_path})
+                    continue
+                logging.info(f"Suspicious processes {pids} terminated; quarantining {file_path}",
+                             extra={'action': 'terminated', 'pids': pids, 'exe': file_path})
+                stopped_files.append(file_path)
+
+            # Quarantine the executables in parallel
+            if stopped_files:
+                with ThreadPoolExecutor(max_workers=min(len(stopped_files), RESPONSE_WORKERS)) as pool:
+                    quarantined = [path for path in pool.map(quarantine_file, stopped_files) if path]
+                METRICS.inc('pycontain_files_quarantined_total', len(quarantined))
+        except Exception as e:
+            logging.error(f"Error handling suspicious processes {all_pids}: {e}")
+        finally:
+            METRICS.observe('response', time.perf_counter() - start)
+            with self._lock:
+                self._in_flight.difference_update(all_pids)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Stop accepting work, optionally waiting for in-flight responses to finish.
+
+        Args:
+            wait (bool): Block until every scheduled action has completed (default is True).
+        """
+        self._executor.shutdown(wait=wait)
+
+class ProcessEventSource:
+    """
+    Report process executions as they happen instead of polling the whole process table.
+
+    On Linux the netlink process connector delivers an event for every exec(); it needs root
+    (CAP_NET_ADMIN). Without it the source falls back to listing /proc at a short interval and
+    reporting PIDs it has not seen before. procfs does not emit inotify events, so polling is
+    the only fallback available there.
+
+    The receiving thread only reads each new process's /proc entry, before a short-lived process
+    can exit, and queues it; hashing and signature checks run on a separate handler thread so a
+    slow hash cannot let the connector's receive buffer fill up. If it does overflow (ENOBUFS,
+    e.g. in an exec burst) the missed events are unknown, so every process in /proc is checked.
+
+    Args:
+        on_exec (callable): Called from the source's handler thread with the process information
+            ('pid', 'name', 'exe') of every newly executed process.
+        poll_interval (float): Seconds between /proc listings in fallback mode.
+    """
+
+    def __init__(self, on_exec: Callable[[Dict], None], poll_interval: float = PROC_POLL_INTERVAL) -> None:
+        self.on_exec = on_exec
+        self.poll_interval = poll_interval
+        self.overruns = 0
+        self._events: queue.Queue = queue.Queue()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._handler_thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start delivering events on background threads."""
+        self._handler_thread = threading.Thread(target=self._handle, name='process-event-handler', daemon=True)
+        self._handler_thread.start()
+        self._thread = threading.Thread(target=self._run, name='process-events', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop delivering events and wait for the background threads to exit."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+        if self._handler_thread:
+            self._events.put(None)
+            self._handler_thread.join()
+
+    def _run(self) -> None:
+        try:
+            sock = self._open_proc_connector()
+        except OSError as e:
+            logging.warning(f"Process connector unavailable ({e}); polling /proc for new processes instead.")
+            self._poll_proc()
+            return
+
+        logging.info("Listening for process executions on the netlink process connector.")
+        with sock:
+            self._listen(sock)
+
+    @staticmethod
+    def _open_proc_connector() -> socket.socket:
+        """Open a netlink connector socket and subscribe it to process events."""
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_CONNECTOR)
+        try:
+            sock.bind((0, CN_IDX_PROC))
+            payload = struct.pack('=I', PROC_CN_MCAST_LISTEN)
+            cn_msg = CN_MSG_HEADER.pack(CN_IDX_PROC, CN_VAL_PROC, 0, 0, len(payload), 0) + payload
+            sock.send(NLMSG_HEADER.pack(NLMSG_HEADER.size + len(cn_msg), NLMSG_DONE, 0, 0, os.getpid()) + cn_msg)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _listen(self, sock: socket.socket) -> None:
+        """Block on the connector socket and dispatch exec events until stopped."""
+        event_offset = NLMSG_HEADER.size + CN_MSG_HEADER.size
+        while not self._stop_event.is_set():
+            # Wake up periodically only to notice stop requests
+            readable, _, _ = select.select([sock], [], [], 1.0)
+            if not readable:
+                continue
+            try:
+                data = sock.recv(65536)
+            except OSError as e:
+                if e.errno != errno.ENOBUFS:
+                    logging.error(f"Process connector failed ({e}); polling /proc for new processes instead.")
+                    self._poll_proc()
+                    return
+                self.overruns += 1
+                METRICS.inc('pycontain_event_overruns_total')
+                logging.warning("Process connector buffer overrun; process events were lost, rescanning /proc.")
+                self._rescan()
+                continue
+            offset = 0
+            while offset + NLMSG_HEADER.size <= len(data):
+                msg_len = NLMSG_HEADER.unpack_from(data, offset)[0]
+                if msg_len < NLMSG_HEADER.size:
+                    break
+                what = PROC_EVENT_HEADER.unpack_from(data, offset + event_offset)[0]
+                if what == PROC_EVENT_EXEC:
+                    _, tgid = PROC_EXEC_EVENT.unpack_from(data, offset + event_offset + PROC_EVENT_HEADER.size)
+                    self._dispatch(tgid)
+                offset += (msg_len + 3) & ~3
+
+    def _poll_proc(self) -> None:
+        """Report PIDs that appear in /proc between successive listings."""
+        known_pids: Set[int] = set()
+        # If this listing fails, the first one that succeeds checks every process
+        self._list_pids(known_pids)
+        while not self._stop_event.wait(self.poll_interval):
+            current_pids: Set[int] = set()
+            if not self._list_pids(current_pids):
+                continue
+            for pid in current_pids - known_pids:
+                self._dispatch(pid)
+            known_pids = current_pids
+
+    @staticmethod
+    def _list_pids(pids: Set[int]) -> bool:
+        """Add the PIDs in /proc to pids. Returns False, after logging why, if /proc could not be listed."""
+        try:
+            pids.update(iter_proc_pids())
+        except OSError as e:
+            logging.error(f"Could not list /proc for new processes: {e}")
+            return False
+        return True
+
+    def _rescan(self) -> None:
+        """Check every running process, after events may have been lost."""
+        pids: Set[int] = set()
+        if self._list_pids(pids):
+            for pid in pids:
+                self._dispatch(pid)
+
+    def _dispatch(self, pid: int) -> None:
+        info = read_proc_process(pid)
+        if info is not None:
+            self._events.put(info)
+
+    def _handle(self) -> None:
+        """Run on_exec for queued processes until stop() queues None."""
+        while True:
+            info = self._events.get()
+            if info is None:
+                return
+            try:
+                self.on_exec(info)
+            except Exception as e:
+                logging.error(f"Error handling process event for PID {info['pid']}: {e}")
+
+def build_ioc_index(data: Dict) -> IOCIndex:
+    """
+    Build the lookup tables for one version of the incident data.
+
+    Args:
+        data (dict): The parsed incident data with 'malicious_ips' and 'suspicious_programs'.
+
+    Returns:
+        IOCIndex: The malicious IP set, the signature index and the set of signature file sizes.
+    """
+    signature_index = build_signature_index(data.get('suspicious_programs', []))
+    sizes = [sp.get('size') for sp in signature_index.values()]
+    return IOCIndex(
+        malicious_ips=frozenset(data.get('malicious_ips', [])),
+        signature_index=signature_index,
+        signature_sizes=frozenset(int(size) for size in sizes) if None not in sizes else None
+    )
+
+class IOCStore:
+    """
+    Hold the current IOC index and reload it in the background when the feed file changes.
+
+    A new index is built completely on the watcher thread and handed over under a lock, then
+    only published by swap_pending(), which the scan loop calls between cycles. Readers always
+    get a complete index through `current` without taking a lock, because publishing is a single
+    reference assignment. A feed that cannot be indexed is logged and retried when it changes.
+
+    Args:
+        json_file_path (str): The path of the incident data JSON file.
+        poll_interval (float): Seconds between checks of the file for changes.
+    """
+
+    def __init__(self, json_file_path: str, poll_interval: float = FEED_POLL_INTERVAL) -> None:
+        self.json_file_path = json_file_path
+        self.poll_interval = poll_interval
+        self.current: Optional[IOCIndex] = None
+        self._pending: Optional[IOCIndex] = None
+        self._pending_lock = threading.Lock()
+        self._loaded_version: Optional[Tuple[int, int, int]] = None
+        self._failed_version: Optional[Tuple[int, int, int]] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _file_version(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            file_stat = os.stat(self.json_file_path)
+        except OSError:
+            return None
+        return (file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns)
+
+    def _build(self) -> Optional[IOCIndex]:
+        version = self._file_version()
+        data = load_json_file(self.json_file_path)
+        if data is None:
+            return None
+        index = build_ioc_index(data)
+        self._loaded_version = version
+        return index
+
+    def load(self) -> bool:
+        """
+        Load the feed synchronously and make it current.
+
+        Returns:
+            bool: True if the feed was loaded, False if it could not be read or parsed.
+        """
+        index = self._build()
+        if index is None:
+            return False
+        self.current = index
+        return True
+
+    def swap_pending(self) -> bool:
+        """
+        Publish a newly built index, if there is one. Call this between scan cycles.
+
+        Returns:
+            bool: True if a new index was swapped in.
+        """
+        with self._pending_lock:
+            pending, self._pending = self._pending, None
+        if pending is None:
+            return False
+        self.current = pending
+        METRICS.inc('pycontain_feed_reloads_total')
+        logging.info(f"Reloaded IOC feed: {len(pending.malicious_ips)} malicious IPs, "
+                     f"{len(pending.signature_index)} program signatures", extra={'action': 'feed_reloaded'})
+        return True
+
+    def start_watching(self) -> None:
+        """Start checking the feed file for changes on a background thread."""
+        self._thread = threading.Thread(target=self._watch, name='ioc-feed', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop watching the feed file."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+
+    def _watch(self) -> None:
+        while not self._stop_event.wait(self.poll_interval):
+            version = self._file_version()
+            if version is None or version in (self._loaded_version, self._failed_version):
+                continue
+            try:
+                index = self._build()
+            except Exception as e:
+                # Parsed but malformed (e.g. a non-integer size); wait for the file to change
+                self._failed_version = version
+                logging.error(f"Cannot index IOC feed {self.json_file_path}: {e!r}; keeping the current feed")
+                continue
+            if index is None:
+                # Not valid JSON (load_json_file logged why). A half-written file is retried once
+                # the write finishes, since that changes its size or mtime.
+                self._failed_version = version
+                continue
+            with self._pending_lock:
+                self._pending = index
+
+def iter_candidate_files(root: str, sizes: Optional[Set[int]]) -> Iterator[Tuple[str, os.stat_result]]:
+    """
+    Walk a directory tree and yield the regular files whose size matches a known signature.
+
+    Args:
+        root (str): The directory to walk.
+        sizes (set): The file sizes of known signatures, or None to yield every file.
+
+    Yields:
+        tuple: The file path and its stat result.
+    """
+    pending_dirs = [root]
+    visited = 0
+    while pending_dirs:
+        directory = pending_dirs.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name != QUARANTINE_DIR:
+                                pending_dirs.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            visited += 1
+                            file_stat = entry.stat(follow_symlinks=False)
+                            if sizes is None or file_stat.st_size in sizes:
+                                yield entry.path, file_stat
+                    except OSError:
+                        continue
+        except OSError as e:
+            logging.warning(f"Cannot sweep directory {directory}: {e}")
+    METRICS.inc('pycontain_files_swept_total', visited)
+
+def _init_sweep_worker(log_queue: 'multiprocessing.Queue') -> None:
+    """Send a sweep worker's log records to the parent process, which writes them."""
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    root_logger.setLevel(logging.INFO)
+
+class _ForwardToLogger(logging.Handler):
+    """Pass records received from sweep workers to the parent's own loggers."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        logging.getLogger(record.name).handle(record)
+
+def _hash_candidate(candidate: Tuple[str, Tuple[int, int, int, int]]) -> Tuple[str, Tuple[int, int, int, int], str]:
+    """Hash one sweep candidate; runs in a worker process."""
+    file_path, cache_key = candidate
+    return file_path, cache_key, compute_file_hash(file_path, hash_type='sha256')
+
+def _walk_roots(roots: List[str], sizes: Optional[Set[int]], walkers: ThreadPoolExecutor, bound: int,
+                cancelled: threading.Event) -> Iterator[Tuple[str, os.stat_result]]:
+    """
+    Walk every root on its own thread and yield their candidates as they are found.
+
+    At most bound candidates wait to be consumed; set cancelled to stop the walkers early.
+    """
+    candidates: queue.Queue = queue.Queue(maxsize=bound)
+
+    def put(item: Optional[Tuple[str, os.stat_result]]) -> bool:
+        while not cancelled.is_set():
+            try:
+                candidates.put(item, timeout=STOP_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def walk(root: str) -> None:
+        try:
+            for candidate in iter_candidate_files(root, sizes):
+                if not put(candidate):
+                    return
+        finally:
+            put(None)
+
+    for root in roots:
+        walkers.submit(walk, root)
+    remaining = len(roots)
+    while remaining:
+        candidate = candidates.get()
+        if candidate is None:
+            remaining -= 1
+        else:
+            yield candidate
+
+def sweep_paths(roots: List[str], ioc_index: IOCIndex, workers: Optional[int] = None) -> List[Tuple[str, Dict]]:
+    """
+    Sweep directory trees for files matching a suspicious program signature and quarantine them.
+
+    Each root is walked on its own thread, so separate disks are read concurrently. Files are
+    prefiltered by the signature sizes, and the remaining candidates are hashed across a process
+    pool as they are found unless their hash is already cached. Worker log records are written
+    by this process.
+
+    Args:
+        roots (list): The directories to sweep.
+        ioc_index (IOCIndex): The signatures to match against.
+        workers (int): The number of hashing processes (default is the number of CPUs).
+
+    Returns:
+        list: The (file path, signature) pairs of every match.
+
+    Side Effects:
+        Logs a warning for each match and moves the matching files to quarantine.
+    """
+    if ioc_index.signature_sizes is None:
+        logging.warning("Some signatures have no file size; sweeping will hash every file.")
+
+    workers = workers or os.cpu_count() or 1
+    hashes: List[Tuple[str, str]] = []
+
+    def uncached(candidates: Iterator[Tuple[str, os.stat_result]]) -> Iterator[Tuple[str, Tuple[int, int, int, int]]]:
+        # Answer what we can from the hash cache; runs on the pool's task thread
+        for file_path, file_stat in candidates:
+            METRICS.inc('pycontain_sweep_candidates_total')
+            cache_key = (file_stat.st_dev, file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns)
+            cached = _file_hash_cache.get(cache_key)
+            if cached is not None:
+                METRICS.inc('pycontain_hash_cache_hits_total')
+                hashes.append((file_path, cached))
+            else:
+                yield file_path, cache_key
+
+    log_queue: multiprocessing.Queue = multiprocessing.Queue()
+    listener = logging.handlers.QueueListener(log_queue, _ForwardToLogger())
+    listener.start()
+    cancelled = threading.Event()
+    try:
+        # Hash candidates across CPU cores while the walk is still finding more
+        with METRICS.time_stage('sweep'), ThreadPoolExecutor(max_workers=max(1, len(roots))) as walkers:
+            try:
+                with multiprocessing.Pool(workers, initializer=_init_sweep_worker, initargs=(log_queue,)) as hashers:
+                    candidates = _walk_roots(roots, ioc_index.signature_sizes, walkers,
+                                             workers * SWEEP_CHUNK_SIZE * 2, cancelled)
+                    for file_path, cache_key, file_hash in hashers.imap_unordered(
+                            _hash_candidate, uncached(candidates), chunksize=SWEEP_CHUNK_SIZE):
+                        METRICS.inc('pycontain_hashes_computed_total')
+                        if file_hash:
+                            if len(_file_hash_cache) >= HASH_CACHE_SIZE:
+                                _file_hash_cache.clear()
+                            _file_hash_cache[cache_key] = file_hash
+                            hashes.append((file_path, file_hash))
+                    hashers.close()
+                    hashers.join()
+            finally:
+                # Unblocks walkers still waiting to hand over candidates if hashing failed
+                cancelled.set()
+    finally:
+        listener.stop()
+
+    matches = []
+    for file_path, file_hash in hashes:
+        signature = ioc_index.signature_index.get(file_hash)
+        if signature:
+            logging.warning(f"Suspicious file found on disk: {file_path} matches {signature.get('name')} "
+                            f"with hash: {file_hash}",
+                            extra={'action': 'detected', 'exe': file_path, 'hash': file_hash,
+                                   'signature': signature.get('name')})
+            matches.append((file_path, signature))
+    METRICS.inc('pycontain_file_matches_total', len(matches))
+
+    # Quarantine the matches in parallel
+    if matches:
+        with ThreadPoolExecutor(max_workers=min(len(matches), RESPONSE_WORKERS)) as pool:
+            quarantined = [path for path in pool.map(quarantine_file, [path for path, _ in matches]) if path]
+        METRICS.inc('pycontain_files_quarantined_total', len(quarantined))
+    return matches
+
+def encode_frame(message: Dict) -> bytes:
+    """
+    Encode a message as a length-prefixed, compressed JSON frame.
+
+    Args:
+        message (dict): The message to send.
+
+    Returns:
+        bytes: The frame.
+    """
+    payload = zlib.compress(json.dumps(message, separators=(',', ':'), default=str).encode('utf-8'))
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+def decode_frame_payload(payload: bytes) -> Dict:
+    """
+    Decode the payload of a frame produced by encode_frame.
+
+    Args:
+        payload (bytes): The frame without its length prefix.
+
+    Returns:
+        dict: The message.
+
+    Raises:
+        ValueError: If the payload is truncated, decompresses to more than MAX_FRAME_SIZE bytes
+            or is not a JSON object.
+        zlib.error: If the payload is not valid zlib data.
+    """
+    decompressor = zlib.decompressobj()
+    # Bounded, so a small frame cannot expand into a huge allocation
+    data = decompressor.decompress(payload, MAX_FRAME_SIZE)
+    if decompressor.unconsumed_tail:
+        raise ValueError(f"frame decompresses to more than {MAX_FRAME_SIZE} bytes")
+    if not decompressor.eof:
+        raise ValueError("truncated frame")
+    message = json.loads(data)
+    if not isinstance(message, dict):
+        raise ValueError(f"frame holds a JSON {type(message).__name__}, not an object")
+    return message
+
+def open_agent_socket(address: str) -> socket.socket:
+    """
+    Connect to a collector.
+
+    Args:
+        address (str): 'unix:/path/to/socket' or 'host:port'.
+
+    Returns:
+        socket.socket: The connected socket.
+    """
+    if address.startswith('unix:'):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(address[len('unix:'):])
+        except OSError:
+            sock.close()
+            raise
+        return sock
+    host, _, port = address.rpartition(':')
+    return socket.create_connection((host.strip('[]'), int(port)))
+
+class AgentReporter:
+    """
+    Batch detections and scan metrics and send them to a collector over one persistent connection.
+
+    Detections are queued in memory (the oldest are dropped beyond AGENT_MAX_QUEUED) and sent by a
+    background thread when a batch fills up or the flush interval passes. If the collector is
+    unreachable the batch is kept and the connection retried with exponential backoff.
+
+    Args:
+        address (str): The collector address, 'unix:/path' or 'host:port'.
+        batch_size (int): Send as soon as this many detections are queued.
+        flush_interval (float): Send at least this often, in seconds, when there is something to send.
+    """
+
+    def __init__(self, address: str, batch_size: int = AGENT_BATCH_SIZE,
+                 flush_interval: float = AGENT_FLUSH_INTERVAL) -> None:
+        self.address = address
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.host = socket.gethostname()
+        self._detections: deque = deque(maxlen=AGENT_MAX_QUEUED)
+        self._metrics: Optional[Dict[str, float]] = None
+        self._lock = threading.Lock()
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._sock: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def add_detection(self, detection: Dict) -> None:
+        """Queue a detection for the next batch."""
+        with self._lock:
+            self._detections.append(detection)
+            full = len(self._detections) >= self.batch_size
+        if full:
+            self._wake_event.set()
+
+    def set_metrics(self, metrics: Dict[str, float]) -> None:
+        """Replace the metrics snapshot sent with the next batch."""
+        with self._lock:
+            self._metrics = metrics
+
+    def start(self) -> None:
+        """Start sending batches on a background thread."""
+        self._thread = threading.Thread(target=self._run, name='agent', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Send whatever is still queued (one attempt) and close the connection."""
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread:
+            self._thread.join()
+
+    def _take_batch(self) -> Optional[Dict]:
+        with self._lock:
+            if not self._detections and self._metrics is None:
+                return None
+            detections = [self._detections.popleft() for _ in range(min(self.batch_size, len(self._detections)))]
+            metrics, self._metrics = self._metrics, None
+        return {'type': 'batch', 'host': self.host, 'sent': time.time(), 'detections': detections, 'metrics': metrics}
+
+    def _requeue(self, batch: Dict) -> None:
+        with self._lock:
+            self._detections.extendleft(reversed(batch['detections']))
+            if self._metrics is None:
+                self._metrics = batch['metrics']
+
+    def _send(self, batch: Dict) -> bool:
+        try:
+            if self._sock is None:
+                self._sock = open_agent_socket(self.address)
+            self._sock.sendall(encode_frame(batch))
+            return True
+        except OSError as e:
+            logging.error(f"Error sending {len(batch['detections'])} detections to collector {self.address}: {e}")
+            if self._sock is not None:
+                self._sock.close()
+                self._sock = None
+            return False
+
+    def _run(self) -> None:
+        retry_delay = AGENT_RECONNECT_DELAY
+        wait_time = self.flush_interval
+        while True:
+            self._wake_event.wait(wait_time)
+            self._wake_event.clear()
+            stopping = self._stop_event.is_set()
+
+            # Drain everything queued, one batch per frame
+            while (batch := self._take_batch()) is not None:
+                if not self._send(batch):
+                    self._requeue(batch)
+                    wait_time = retry_delay
+                    retry_delay = min(retry_delay * 2, AGENT_MAX_RECONNECT_DELAY)
+                    break
+                retry_delay = AGENT_RECONNECT_DELAY
+                wait_time = self.flush_interval
+
+            if stopping:
+                break
+        if self._sock is not None:
+            self._sock.close()
+
+class AgentLogHandler(logging.Handler):
+    """
+    Forward log records that describe a detection or response action to an AgentReporter.
+
+    Args:
+        reporter (AgentReporter): Receives the detections.
+    """
+
+    def __init__(self, reporter: AgentReporter) -> None:
+        super().__init__(logging.INFO)
+        self.reporter = reporter
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if getattr(record, 'action', None) not in AGENT_ACTIONS:
+            return
+        detection = {'time': record.created, 'level': record.levelname, 'message': record.getMessage()}
+        for field in LOG_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                detection[field] = value
+        self.reporter.add_detection(detection)
+
+class Collector:
+    """
+    Accept connections from many agents and aggregate their detections and metrics per host.
+    """
+
+    def __init__(self) -> None:
+        self.hosts: Dict[str, Dict] = {}
+        self.connected_agents = 0
+
+    def ingest(self, message: Dict) -> None:
+        """
+        Record one batch from an agent.
+
+        Args:
+            message (dict): A decoded batch message.
+        """
+        host = message.get('host', 'unknown')
+        summary = self.hosts.setdefault(host, {'detections': 0, 'actions': {}, 'metrics': None, 'last_seen': 0.0})
+        summary['last_seen'] = time.time()
+        detections = message.get('detections')
+        for detection in detections if isinstance(detections, list) else []:
+            if not isinstance(detection, dict):
+                continue
+            summary['detections'] += 1
+            action = detection.get('action')
+            summary['actions'][action] = summary['actions'].get(action, 0) + 1
+            fields = {field: detection[field] for field in LOG_FIELDS if field in detection}
+            fields['host'] = host
+            logging.warning(f"[{host}] {detection.get('message', '')}", extra=fields)
+        if message.get('metrics'):
+            summary['metrics'] = message['metrics']
+
+    async def handle_agent(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Read frames from one agent until it disconnects."""
+        self.connected_agents += 1
+        try:
+            while True:
+                header = await reader.readexactly(FRAME_HEADER.size)
+                (length,) = FRAME_HEADER.unpack(header)
+                if length > MAX_FRAME_SIZE:
+                    logging.error(f"Dropping agent connection: frame of {length} bytes exceeds the limit")
+                    break
+                self.ingest(decode_frame_payload(await reader.readexactly(length)))
+        except asyncio.IncompleteReadError:
+            pass
+        except (OSError, ValueError, zlib.error) as e:
+            logging.error(f"Dropping agent connection: {e}")
+        finally:
+            self.connected_agents -= 1
+            writer.close()
+
+    def report(self) -> str:
+        """Summarise the detections received so far, one line per host."""
+        lines = [f"{self.connected_agents} agents connected, {len(self.hosts)} hosts reported"]
+        for host, summary in sorted(self.hosts.items(), key=lambda item: -item[1]['detections']):
+            actions = ', '.join(f"{action}={count}" for action, count in sorted(summary['actions'].items()))
+            lines.append(f"  {host}: {summary['detections']} detections ({actions or 'none'})")
+        return '\n'.join(lines)
+
+    async def serve(self, address: str, report_interval: float = COLLECTOR_REPORT_INTERVAL) -> None:
+        """
+        Accept agents on the given address and print a summary at every report interval.
+
+        Args:
+            address (str): 'unix:/path/to/socket' or 'host:port'.
+            report_interval (float): Seconds between summaries.
+        """
+        if address.startswith('unix:'):
+            server = await asyncio.start_unix_server(self.handle_agent, path=address[len('unix:'):])
+        else:
+            host, _, port = address.rpartition(':')
+            server = await asyncio.start_server(self.handle_agent, host.strip('[]') or None, int(port))
+        logging.info(f"Collector listening on {address}")
+        async with server:
+            while True:
+                await asyncio.sleep(report_interval)
+                print(self.report())
+
+def run_scan_cycle(malicious_ips: Set[str], signature_index: Dict[str, Dict], blocker: FirewallBlocker,
+                   responder: ResponseExecutor) -> None:
+    """
+    Run one full scan of network connections and running processes.
+
+    Args:
+        malicious_ips (set): A set of malicious IP addresses.
+        signature_index (dict): A dictionary mapping suspicious program hashes to their signatures.
+        blocker (FirewallBlocker): Blocks the malicious IPs found during the scan.
+        responder (ResponseExecutor): Handles the suspicious processes found during the scan.
+    """
+    with METRICS.time_stage('cycle'):
+        # Check active network connections and block new malicious IPs in one update
+        with METRICS.time_stage('connections'):
+            active_connections = get_active_network_connections()
+        with METRICS.time_stage('ip_lookup'):
+            check_malicious_ips(active_connections, malicious_ips, blocker)
+        with METRICS.time_stage('block'):
+            blocker.flush()
+
+        # Check running processes
+        with METRICS.time_stage('processes'):
+            running_processes = get_running_processes()
+        with METRICS.time_stage('program_lookup'):
+            check_suspicious_programs(running_processes, signature_index, responder)
+    METRICS.inc('pycontain_scan_cycles_total')
+
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Parse the command line options of the monitor.
+
+    Args:
+        argv (list): The arguments to parse (default is sys.argv[1:]).
+
+    Returns:
+        argparse.Namespace: The parsed options.
+    """
+    parser = argparse.ArgumentParser(description="Monitor network connections and processes for known indicators of compromise.")
+    parser.add_argument('--data', default='incident_data.json',
+                        help="JSON file containing malicious IPs and suspicious programs (default: %(default)s)")
+    parser.add_argument('--interval', type=float, default=0,
+                        help="Repeat the full scan every INTERVAL seconds; 0 scans once (default: %(default)s)")
+    parser.add_argument('--watch', action='store_true',
+                        help="Keep running and check every new process as soon as it starts (Linux)")
+    parser.add_argument('--sweep', nargs='+', metavar='DIR',
+                        help="Sweep these directories for files matching a suspicious program signature, then exit")
+    parser.add_argument('--sweep-workers', type=int, default=None,
+                        help="Number of hashing processes for --sweep (default: number of CPUs)")
+    parser.add_argument('--agent', metavar='ADDR',
+                        help="Send detections and metrics to a collector at ADDR ('host:port' or 'unix:/path')")
+    parser.add_argument('--collector', metavar='ADDR',
+                        help="Run as a collector accepting agents on ADDR instead of scanning")
+    parser.add_argument('--log-file', default=LOG_FILE,
+                        help="JSON-lines log file, rotated by size and daily (default: %(default)s)")
+    parser.add_argument('--metrics-port', type=int, default=0,
+                        help="Serve Prometheus metrics on 127.0.0.1:PORT/metrics; 0 disables (default: %(default)s)")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Log the IP addresses that would be blocked instead of changing the firewall")
+    return parser.parse_args(argv)
+
+def run_monitor(args: argparse.Namespace) -> None:
+    """
+    Load the incident data and run the scans requested on the command line.
+
+    Args:
+        args (argparse.Namespace): The parsed command line options.
     """
+    if args.collector:
+        collector = Collector()
+        try:
+            asyncio.run(collector.serve(args.collector))
+        except KeyboardInterrupt:
+            print(collector.report())
+        return
+
     run_as_admin()
 
     # Load JSON file containing malicious IPs and suspicious programs
-    json_file_path = 'incident_data.json'
-    data = load_json_file(json_file_path)
-    if data is None:
+    ioc_store = IOCStore(args.data)
+    if not ioc_store.load():
         print("Failed to load incident data. Please check the JSON file path and format.")
         return
 
-    # Extract malicious IPs and suspicious programs from the data
-    malicious_ips = set(data.get('malicious_ips', []))
-    suspicious_programs = data.get('suspicious_programs', {})
+    reporter = None
+    if args.agent:
+        reporter = AgentReporter(args.agent)
+        logging.getLogger().addHandler(AgentLogHandler(reporter))
+        reporter.start()
+
+    if args.sweep:
+        try:
+            matches = sweep_paths(args.sweep, ioc_store.current, args.sweep_workers)
+            print(f"Sweep complete: {len(matches)} suspicious files found and quarantined.")
+        finally:
+            if reporter:
+                reporter.set_metrics(METRICS.snapshot())
+                reporter.stop()
+        return
+
+    blocker = FirewallBlocker(default_firewall_backend(dry_run=args.dry_run))
+    responder = ResponseExecutor()
+
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+    METRICS.set_gauge('pycontain_scan_interval_seconds', args.interval)
+
+    event_source = None
+    if args.watch:
+        if not USE_PROC_FASTPATH:
+            print("Watching for new processes is only supported on Linux.")
+            return
+        event_source = ProcessEventSource(
+            lambda info: check_suspicious_programs([info], ioc_store.current.signature_index, responder))
+        event_source.start()
 
-    # Check active network connections
-    active_connections = get_active_network_connections()
-    check_malicious_ips(active_connections, malicious_ips)
+    # Pick up feed updates while running continuously
+    if args.interval > 0 or event_source:
+        ioc_store.start_watching()
 
-    # Check running processes
-    running_processes = get_running_processes()
-    check_suspicious_programs(running_processes, suspicious_programs)
+    try:
+        first_cycle = True
+        while True:
+            ioc_store.swap_pending()
+            if first_cycle or args.interval > 0:
+                cycle_start = time.monotonic()
+                ioc_index = ioc_store.current
+                run_scan_cycle(ioc_index.malicious_ips, ioc_index.signature_index, blocker, responder)
+                cycle_duration = time.monotonic() - cycle_start
+                METRICS.set_gauge('pycontain_last_cycle_duration_seconds', cycle_duration)
+                if reporter:
+                    reporter.set_metrics(METRICS.snapshot())
+                first_cycle = False
+
+            if args.interval > 0:
+                if cycle_duration > args.interval:
+                    METRICS.inc('pycontain_scan_overruns_total')
+                    logging.warning(f"Scan cycle took {cycle_duration:.2f}s, longer than the {args.interval}s interval")
+                time.sleep(max(0.0, args.interval - cycle_duration))
+            elif event_source:
+                # Event-driven detection only; wake up just to swap in feed updates
+                time.sleep(ioc_store.poll_interval)
+            else:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ioc_store.stop()
+        if event_source:
+            event_source.stop()
+        responder.shutdown()
+        if reporter:
+            reporter.stop()
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Main function to coordinate the monitoring and handling of incidents on the machine.
+
+    The function performs the following tasks:
+    1. Ensures the script is running with administrative privileges.
+    2. Loads data from a JSON file containing malicious IPs and suspicious programs.
+    3. Checks active network connections for connections to malicious IPs.
+    4. Checks running processes for suspicious programs.
+    5. Optionally repeats the scan at an interval and checks new processes as they start.
+    6. Alternatively sweeps directories on disk for suspicious files (--sweep).
+    7. Optionally reports results to a central collector (--agent), or runs as one (--collector).
+    """
+    args = parse_arguments(argv)
+    log_listener = configure_logging(args.log_file)
+    try:
+        run_monitor(args)
+    finally:
+        log_listener.stop()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,326 @@
+'''
+Synthetic-load benchmark for PyContain.
+
+Replaces psutil, the filesystem and the firewall with in-memory fakes so that
+PyContain's scan stages can be timed on a simulated host of any size, e.g.
+
+    python PyContainBenchmark.py --processes 50000 --connections 200000 --ioc-entries 1000000
+
+Each stage is run once for timing and once under tracemalloc for its peak memory.
+'''
+
+import argparse
+import contextlib
+import gc
+import hashlib
+import json
+import logging
+import random
+import time
+import tracemalloc
+from collections import namedtuple
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import PyContain
+
+# Shapes of the objects psutil and os.stat return, limited to the fields PyContain reads
+FakeConnection = namedtuple('FakeConnection', ['fd', 'family', 'type', 'laddr', 'raddr', 'status', 'pid'])
+FakeStat = namedtuple('FakeStat', ['st_dev', 'st_ino', 'st_size', 'st_mtime_ns'])
+StageResult = namedtuple('StageResult', ['stage', 'seconds', 'peak_mib'])
+
+TCP_STATES = ('ESTABLISHED', 'LISTEN', 'TIME_WAIT', 'CLOSE_WAIT')
+
+def random_ipv4(rng: random.Random) -> str:
+    """Return a random public-looking IPv4 address."""
+    return f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+
+class FakeProcess:
+    """A psutil.Process stand-in whose signals always succeed."""
+
+    def __init__(self, pid: int, info: Optional[Dict] = None) -> None:
+        self.pid = pid
+        self.info = info
+
+    def terminate(self) -> None:
+        pass
+
+    def kill(self) -> None:
+        pass
+
+class FakePsutil:
+    """
+    The subset of the psutil module PyContain uses, backed by generated processes and connections.
+
+    Args:
+        processes (list): The process information dictionaries ('pid', 'name', 'exe').
+        connections (list): The connections to report.
+    """
+
+    Error = PyContain.psutil.Error
+    NoSuchProcess = PyContain.psutil.NoSuchProcess
+
+    def __init__(self, processes: List[Dict], connections: List[FakeConnection]) -> None:
+        self.processes = processes
+        self.connections = connections
+
+    def net_connections(self, kind: str = 'inet') -> List[FakeConnection]:
+        return list(self.connections)
+
+    def process_iter(self, attrs: Optional[List[str]] = None) -> Iterator[FakeProcess]:
+        for info in self.processes:
+            yield FakeProcess(info['pid'], dict(info))
+
+    def Process(self, pid: int) -> FakeProcess:
+        return FakeProcess(pid)
+
+    def wait_procs(self, procs: List[FakeProcess], timeout: Optional[float] = None) -> Tuple[List, List]:
+        return list(procs), []
+
+class FakeFilesystem:
+    """
+    In-memory executables with fixed hashes.
+
+    Hashing a file costs one SHA-256 over `hash_cost_bytes` bytes, so cold and warm hash-cache
+    runs still differ as they would on disk.
+
+    Args:
+        files (dict): A dictionary mapping file paths to their content hash.
+        hash_cost_bytes (int): The number of bytes to hash per simulated file read.
+    """
+
+    def __init__(self, files: Dict[str, str], hash_cost_bytes: int) -> None:
+        self.files = files
+        self._stats = {path: FakeStat(1, inode, 4096 + inode % 1024, 0) for inode, path in enumerate(files, 1)}
+        self._hash_input = b'\0' * hash_cost_bytes
+        self.quarantined: List[str] = []
+
+    def stat(self, path: str) -> FakeStat:
+        try:
+            return self._stats[path]
+        except KeyError:
+            raise FileNotFoundError(path) from None
+
+    def compute_file_hash(self, file_path: str, hash_type: str = 'sha256') -> str:
+        hashlib.new(hash_type, self._hash_input).digest()
+        return self.files.get(file_path, '')
+
+    def quarantine_file(self, file_path: str) -> Optional[str]:
+        self.quarantined.append(file_path)
+        return file_path
+
+class CountingFirewallBackend(PyContain.FirewallBackend):
+    """A firewall backend that only counts the addresses it is asked to block."""
+
+    requires_admin = False
+
+    def __init__(self) -> None:
+        self.blocked = 0
+        self.batches = 0
+
+    def block(self, ip_addresses: List[str]) -> None:
+        self.blocked += len(ip_addresses)
+        self.batches += 1
+
+class _FakeOsModule:
+    """Delegate to the real os module except for stat(), which reads the fake filesystem."""
+
+    def __init__(self, real_os, filesystem: FakeFilesystem) -> None:
+        self._real_os = real_os
+        self.stat = filesystem.stat
+
+    def __getattr__(self, name: str):
+        return getattr(self._real_os, name)
+
+@contextlib.contextmanager
+def inject_providers(fake_psutil: FakePsutil, filesystem: FakeFilesystem) -> Iterator[None]:
+    """
+    Point PyContain at the fake psutil and filesystem for the duration of the block.
+
+    Args:
+        fake_psutil (FakePsutil): Replaces the psutil module.
+        filesystem (FakeFilesystem): Replaces os.stat, file hashing and quarantine.
+    """
+    saved = {name: getattr(PyContain, name)
+             for name in ('psutil', 'os', 'USE_PROC_FASTPATH', 'compute_file_hash', 'quarantine_file')}
+    PyContain.psutil = fake_psutil
+    PyContain.os = _FakeOsModule(saved['os'], filesystem)
+    PyContain.USE_PROC_FASTPATH = False
+    PyContain.compute_file_hash = filesystem.compute_file_hash
+    PyContain.quarantine_file = filesystem.quarantine_file
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(PyContain, name, value)
+
+def generate_host(args: argparse.Namespace) -> Tuple[Dict, FakePsutil, FakeFilesystem]:
+    """
+    Generate the IOC feed and the simulated host described by the command line options.
+
+    Args:
+        args (argparse.Namespace): The parsed command line options.
+
+    Returns:
+        tuple: The incident data, the fake psutil module and the fake filesystem.
+    """
+    rng = random.Random(args.seed)
+
+    malicious_ips = list({random_ipv4(rng) for _ in range(args.ioc_entries)})
+    signatures = [{'name': f'malware{i}', 'tlsh': f'{rng.getrandbits(256):064x}'} for i in range(args.ioc_entries)]
+
+    # Distinct executables; a few of them carry a known-bad hash
+    files = {}
+    for i in range(args.executables):
+        if rng.random() < args.bad_fraction:
+            content_hash = rng.choice(signatures)['tlsh']
+        else:
+            content_hash = f'{rng.getrandbits(256):064x}'
+        files[f'/opt/app{i}/bin/program{i}'] = content_hash
+    executables = list(files)
+
+    processes = [{'pid': pid, 'name': f'proc{pid}', 'exe': rng.choice(executables)}
+                 for pid in range(1000, 1000 + args.processes)]
+
+    connections = []
+    for i in range(args.connections):
+        if rng.random() < args.bad_fraction:
+            remote_ip = rng.choice(malicious_ips)
+        else:
+            remote_ip = random_ipv4(rng)
+        connections.append(FakeConnection(
+            i, 2, 1,
+            PyContain.Address('10.0.0.1', 1024 + i % 60000),
+            PyContain.Address(remote_ip, rng.choice((80, 443, 8080))),
+            rng.choice(TCP_STATES),
+            rng.choice(processes)['pid']
+        ))
+
+    data = {'malicious_ips': malicious_ips, 'suspicious_programs': signatures}
+    return data, FakePsutil(processes, connections), FakeFilesystem(files, args.hash_bytes)
+
+def measure(stage: str, function: Callable[[], object], setup: Optional[Callable[[], None]] = None,
+            memory: bool = True) -> Tuple[StageResult, object]:
+    """
+    Time one run of a stage and measure its peak memory in a second run.
+
+    Args:
+        stage (str): The stage name to report.
+        function (callable): Runs the stage and returns its result.
+        setup (callable): Resets state before each run (e.g. clears caches).
+        memory (bool): Whether to do the tracemalloc run.
+
+    Returns:
+        tuple: The stage result and the value returned by the timed run.
+    """
+    if setup:
+        setup()
+    gc.collect()
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+
+    peak_mib = None
+    if memory:
+        if setup:
+            setup()
+        gc.collect()
+        tracemalloc.start()
+        function()
+        peak_mib = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+    return StageResult(stage, seconds, peak_mib), result
+
+def run_benchmark(args: argparse.Namespace) -> List[StageResult]:
+    """
+    Run every scan stage against the simulated host.
+
+    Args:
+        args (argparse.Namespace): The parsed command line options.
+
+    Returns:
+        list: The timing and memory result of each stage.
+    """
+    data, fake_psutil, filesystem = generate_host(args)
+    results = []
+
+    with inject_providers(fake_psutil, filesystem):
+        result, ioc_index = measure('build_ioc_index', lambda: PyContain.build_ioc_index(data), memory=args.memory)
+        results.append(result)
+
+        result, connections = measure('get_active_network_connections', PyContain.get_active_network_connections,
+                                      memory=args.memory)
+        results.append(result)
+
+        backend = CountingFirewallBackend()
+
+        def check_ips() -> None:
+            blocker = PyContain.FirewallBlocker(backend)
+            PyContain.check_malicious_ips(connections, ioc_index.malicious_ips, blocker)
+            blocker.flush()
+        result, _ = measure('check_malicious_ips', check_ips, memory=args.memory)
+        results.append(result)
+
+        result, processes = measure('get_running_processes', PyContain.get_running_processes, memory=args.memory)
+        results.append(result)
+
+        responder = PyContain.ResponseExecutor()
+        try:
+            def check_programs() -> None:
+                PyContain.check_suspicious_programs(processes, ioc_index.signature_index, responder)
+            result, _ = measure('check_suspicious_programs (cold cache)', check_programs,
+                                setup=PyContain._file_hash_cache.clear, memory=args.memory)
+            results.append(result)
+            result, _ = measure('check_suspicious_programs (warm cache)', check_programs, memory=args.memory)
+            results.append(result)
+        finally:
+            responder.shutdown()
+
+    return results
+
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Parse the benchmark options.
+
+    Args:
+        argv (list): The arguments to parse (default is sys.argv[1:]).
+
+    Returns:
+        argparse.Namespace: The parsed options.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark PyContain's scan stages on a simulated host.")
+    parser.add_argument('--processes', type=int, default=50000, help="Running processes (default: %(default)s)")
+    parser.add_argument('--connections', type=int, default=200000, help="Sockets on the host (default: %(default)s)")
+    parser.add_argument('--ioc-entries', type=int, default=1000000,
+                        help="Malicious IPs and program signatures in the feed, each (default: %(default)s)")
+    parser.add_argument('--executables', type=int, default=5000,
+                        help="Distinct executables the processes run (default: %(default)s)")
+    parser.add_argument('--bad-fraction', type=float, default=0.001,
+                        help="Fraction of connections and executables that match the feed (default: %(default)s)")
+    parser.add_argument('--hash-bytes', type=int, default=1024 * 1024,
+                        help="Bytes hashed per simulated executable read (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=1, help="Random seed (default: %(default)s)")
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help="Skip the tracemalloc runs that measure peak memory")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_arguments(argv)
+    # Keep detection warnings off the console without disabling the logging calls themselves
+    logging.getLogger().addHandler(logging.NullHandler())
+
+    results = run_benchmark(args)
+    if args.json:
+        print(json.dumps([result._asdict() for result in results], indent=2))
+        return
+
+    print(f"PyContain benchmark: {args.processes} processes, {args.connections} connections, "
+          f"{args.ioc_entries} IOC entries, {args.executables} executables\n")
+    print(f"{'Stage':<42}{'Seconds':>12}{'Peak MiB':>12}")
+    print('-' * 66)
+    for result in results:
+        peak = f"{result.peak_mib:.1f}" if result.peak_mib is not None else '-'
+        print(f"{result.stage:<42}{result.seconds:>12.4f}{peak:>12}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Tests for PyContain's /proc readers.
+
+The fixture tests build a fake procfs tree and pass it as proc_root; the live tests compare the
+readers against psutil on the running Linux host.
+"""
+
+import os
+import shutil
+import socket
+import subprocess
+import sys
+
+import pytest
+
+psutil = pytest.importorskip('psutil')
+
+import PyContain
+from PyContain import Address, compute_file_hash, read_proc_connections, read_proc_process, read_proc_processes
+
+LIVE_PROC = pytest.mark.skipif(not PyContain.USE_PROC_FASTPATH, reason="needs a Linux /proc")
+
+TCP_HEADER = "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+
+
+def encode_proc_address(ip: str, port: int, family: int) -> str:
+    """Encode an address the way the kernel prints it in /proc/net/tcp{,6}: 32-bit host-order words."""
+    packed = socket.inet_pton(family, ip)
+    if sys.byteorder == 'little':
+        packed = b''.join(packed[i:i + 4][::-1] for i in range(0, len(packed), 4))
+    return f"{packed.hex().upper()}:{port:04X}"
+
+
+def tcp_line(slot: int, local: tuple, remote: tuple, state: str, family: int) -> str:
+    return (f"{slot:4d}: {encode_proc_address(*local, family)} {encode_proc_address(*remote, family)} "
+            f"{state} 00000000:00000000 00:00000000 00000000  1000        0 {1000 + slot} 1 0000000000000000\n")
+
+
+@pytest.fixture
+def fake_proc(tmp_path):
+    """A procfs tree with a few TCP sockets and processes."""
+    net = tmp_path / 'net'
+    net.mkdir()
+    (net / 'tcp').write_text(TCP_HEADER + ''.join([
+        tcp_line(0, ('0.0.0.0', 22), ('0.0.0.0', 0), '0A', socket.AF_INET),              # listening
+        tcp_line(1, ('192.168.1.5', 51234), ('93.184.216.34', 443), '01', socket.AF_INET),
+        tcp_line(2, ('127.0.0.1', 8080), ('127.0.0.1', 40000), '06', socket.AF_INET),     # time wait
+    ]))
+    (net / 'tcp6').write_text(TCP_HEADER + tcp_line(
+        0, ('2001:db8::1', 50000), ('2606:4700::6810:85e5', 443), '01', socket.AF_INET6))
+
+    binary = tmp_path / 'bin'
+    binary.mkdir()
+    (binary / 'sshd').write_text('')
+    (binary / 'a-very-long-program-name').write_text('')
+    processes = {
+        1: ('sshd', str(binary / 'sshd')),
+        42: ('a-very-long-pro', str(binary / 'a-very-long-program-name')),  # comm is cut to 15 characters
+        77: ('kworker/0:1', None),                                          # kernel thread, no exe link
+        99: ('dropper', str(binary / 'dropper') + ' (deleted)'),             # deleted its own binary
+    }
+    for pid, (comm, exe) in processes.items():
+        proc_dir = tmp_path / str(pid)
+        proc_dir.mkdir()
+        (proc_dir / 'comm').write_text(comm + '\n')
+        if exe:
+            os.symlink(exe, proc_dir / 'exe')
+    (tmp_path / 'self').mkdir()   # Not a PID
+    return tmp_path
+
+
+def test_read_proc_connections_keeps_only_established(fake_proc):
+    connections = read_proc_connections(str(fake_proc))
+    assert [(c.laddr, c.raddr, c.status) for c in connections] == [
+        (Address('192.168.1.5', 51234), Address('93.184.216.34', 443), 'ESTABLISHED'),
+        (Address('2001:db8::1', 50000), Address('2606:4700::6810:85e5', 443), 'ESTABLISHED'),
+    ]
+
+
+def test_read_proc_connections_without_ipv6(fake_proc):
+    (fake_proc / 'net' / 'tcp6').unlink()
+    assert [c.raddr.ip for c in read_proc_connections(str(fake_proc))] == ['93.184.216.34']
+
+
+def test_read_proc_processes(fake_proc):
+    processes = sorted(read_proc_processes(str(fake_proc)), key=lambda p: p['pid'])
+    assert processes == [
+        {'pid': 1, 'name': 'sshd', 'exe': str(fake_proc / 'bin' / 'sshd')},
+        {'pid': 42, 'name': 'a-very-long-program-name', 'exe': str(fake_proc / 'bin' / 'a-very-long-program-name')},
+        {'pid': 77, 'name': 'kworker/0:1', 'exe': ''},
+        {'pid': 99, 'name': 'dropper', 'exe': str(fake_proc / '99' / 'exe')},
+    ]
+
+
+@LIVE_PROC
+def test_read_proc_process_hashes_deleted_executable(tmp_path):
+    program = tmp_path / 'dropper'
+    shutil.copy(os.path.realpath(sys.executable), program)
+    expected = compute_file_hash(str(program))
+    process = subprocess.Popen([str(program), '-c', 'import sys; sys.stdin.read()'], stdin=subprocess.PIPE)
+    try:
+        program.unlink()
+        exe = read_proc_process(process.pid)['exe']
+        assert exe == f'/proc/{process.pid}/exe'
+        assert compute_file_hash(exe) == expected
+    finally:
+        process.communicate()
+
+
+def psutil_connections():
+    return {(tuple(c.laddr), tuple(c.raddr)) for c in psutil.net_connections(kind='tcp')
+            if c.status == psutil.CONN_ESTABLISHED}
+
+
+@LIVE_PROC
+def test_read_proc_connections_matches_psutil():
+    # Open a connection of our own so there is at least one to find
+    with socket.create_server(('127.0.0.1', 0)) as server:
+        client = socket.create_connection(server.getsockname())
+        accepted, _ = server.accept()
+        with client, accepted:
+            before = psutil_connections()
+            ours = {(tuple(c.laddr), tuple(c.raddr)) for c in read_proc_connections()}
+            after = psutil_connections()
+            own = (tuple(client.getsockname()), tuple(client.getpeername()))
+    assert own in ours
+    # Other connections may open or close meanwhile; anything present throughout must be found
+    assert before & after <= ours <= before | after
+
+
+@LIVE_PROC
+def test_read_proc_processes_matches_psutil():
+    before = {p.pid: p.info for p in psutil.process_iter(['name', 'exe'])}
+    ours = {p['pid']: p for p in read_proc_processes()}
+    after = set(psutil.pids())
+    assert os.getpid() in ours
+    assert set(before) & after <= set(ours) <= set(before) | after
+    for pid in set(ours) & set(before):
+        mine, theirs = ours[pid], before[pid]
+        if mine['exe'] and theirs['exe']:
+            assert mine['exe'] == theirs['exe'], pid
+        if mine['name'] and len(mine['name']) < 15:
+            assert mine['name'] == theirs['name'], pid